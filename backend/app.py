@@ -1,17 +1,35 @@
-from openai import OpenAI
+import asyncio
+import bisect
+import hashlib
+import io
 import json
 import os
-from datetime import datetime, date
+import random
+import time
+import weakref
+from datetime import datetime, date, timedelta
 from typing import Optional, List
-from sqlalchemy import create_engine, Column, Integer, String, Date, DateTime, ForeignKey, Text, and_, exists
-from sqlalchemy.orm import declarative_base, sessionmaker, relationship, Session
+from sqlalchemy import Column, Integer, String, Date, DateTime, ForeignKey, Text, Index, and_, delete, exists, func, insert, or_, select, tuple_, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import aliased, declarative_base, sessionmaker, relationship, Session
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import FileResponse
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from starlette.concurrency import run_in_threadpool
 from dotenv import load_dotenv
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.lib.pagesizes import LETTER
-from reportlab.lib.units import inch
+
+import llm_client
+import llm_providers
+import metrics
+import profiling
+from llm_providers import Completion, LLMProvider
+from database import make_async_engine, make_engine, sqlite_pragmas_from_env
+from migrations import run_migrations
+from report_jobs import QueueFull, ReportJob, ReportJobQueue
+from report_store import ReportStore
+import timelines
+import token_budget
+from chat_hub import ChatHub
 
 # Load environment variables from .env file
 load_dotenv()
@@ -34,11 +52,29 @@ DAILY_QUESTIONS_DICT_SCHEMA = {
     }
 }
 
-def generate_daily_questions(patient_description: str):
-    import os
-    KEY = os.getenv("OPENAI_API_KEY")
-    client = OpenAI(api_key=KEY)
+# Bump when the daily-question prompt changes so cached sets are not reused
+DAILY_QUESTIONS_PROMPT_VERSION = "1"
+DAILY_QUESTIONS_MODEL = "gpt-5-mini"
 
+async def llm_complete(generator: str, request: dict, provider: Optional[LLMProvider] = None) -> Completion:
+    """
+    provider.complete() with call count, latency and token usage recorded under `generator`.
+    """
+    provider = provider or llm_providers.get_provider()
+    started = time.perf_counter()
+    with profiling.span("llm", generator=generator, model=request.get("model")) as span:
+        try:
+            completion = await provider.complete(request)
+        except Exception:
+            metrics.record_llm_call(generator, time.perf_counter() - started, ok=False)
+            raise
+        if span is not None:
+            span.attrs.update(completion.usage)
+    metrics.record_llm_call(generator, time.perf_counter() - started, completion.usage)
+    return completion
+
+
+async def generate_daily_questions(patient_description: str, provider: Optional[LLMProvider] = None):
     system_prompt = """
 You are a compassionate, observant, and medically knowledgeable AI assistant working alongside a physician.
 
@@ -76,17 +112,17 @@ The patient described their current condition as follows:
 Based on this information, generate 6 personalized daily health monitoring questions.
 """
 
-    resp = client.chat.completions.create(
-        model="gpt-5-mini",
+    completion = await llm_complete("generate_daily_questions", dict(
+        model=DAILY_QUESTIONS_MODEL,
         messages=[
             {"role": "system", "content": system_prompt},
             {"role": "user", "content": user_prompt}
         ],
         response_format=DAILY_QUESTIONS_DICT_SCHEMA,
         max_completion_tokens=5000
-    )
+    ), provider)
 
-    payload = json.loads(resp.choices[0].message.content)
+    payload = json.loads(completion.content)
     return payload
 
 
@@ -120,12 +156,9 @@ FOLLOWUP_SCHEMA = {
     }
 }
 
-def generate_followup_questions(answers: str, symptoms: str):
-    KEY = os.getenv("OPENAI_API_KEY")
-    if not KEY:
-        raise RuntimeError("OPENAI_API_KEY not set")
-    client = OpenAI(api_key=KEY)
+FOLLOWUP_MODEL = "gpt-5-mini"
 
+async def generate_followup_questions(answers: str, symptoms: str, provider: Optional[LLMProvider] = None):
     system_prompt = """
     You are a helpful and caring medical assistant AI.
 
@@ -175,17 +208,17 @@ def generate_followup_questions(answers: str, symptoms: str):
     Based on this information, generate up to 4 follow-up questions that would help the doctor better understand the patient’s symptom trends and condition.
     """
 
-    resp = client.chat.completions.create(
-        model="gpt-5-mini",
+    completion = await llm_complete("generate_followup_questions", dict(
+        model=FOLLOWUP_MODEL,
         messages=[
             {"role": "system", "content": system_prompt},
             {"role": "user",   "content": user_prompt}
         ],
         response_format=FOLLOWUP_SCHEMA,
         max_completion_tokens=5000
-    )
+    ), provider)
 
-    payload = json.loads(resp.choices[0].message.content)
+    payload = json.loads(completion.content)
 
     # Convert array to dict like {"Q1": "...", "Q2": "..."}
     questions_dict = {item["id"]: item["text"] for item in payload.get("questions", [])}
@@ -211,12 +244,7 @@ TREND_FOLLOWUP_DICT_SCHEMA = {
     }
 }
 
-def generate_trend_followups(answers_over_days: str):
-    KEY = os.getenv("OPENAI_API_KEY")
-    if not KEY:
-        raise RuntimeError("OPENAI_API_KEY not set")
-    client = OpenAI(api_key=KEY)
-    system_prompt = """
+TREND_FOLLOWUP_SYSTEM_PROMPT = """
 You are a compassionate, observant, and medically knowledgeable AI assistant working alongside a physician.
 
 Context:
@@ -257,31 +285,77 @@ Return your follow-up questions in **valid JSON**, for example:
 
 Be concise, context-aware, and human-centered — your job is to notice subtle medical changes and ask the right next questions.
 """
-    user_prompt = f"""
-    Patient timeline (multiple days of answers, JSON-structured):
 
+
+TREND_FOLLOWUP_MODEL = "gpt-5-mini"
+
+
+def summaries_block(summaries) -> str:
+    """
+    Prompt text for cached period summaries [(start, end, summary), ...], oldest first; "" if none.
+    """
+    if not summaries:
+        return ""
+    lines = ["Earlier history (one summary per period, oldest first):"]
+    for start_d, end_d, summary in summaries:
+        lines.append(f"[{start_d.isoformat()} to {end_d.isoformat()}] {summary.strip()}")
+    return "\n".join(lines) + "\n\n"
+
+
+def trend_followup_request(answers_over_days: str, summaries=None, timeline_format: str = "") -> dict:
+    """
+    Chat completion arguments for generate_trend_followups / stream_completion.
+    summaries: optional [(start, end, summary), ...] covering the days before the timeline;
+    timeline_format: how answers_over_days is encoded, when it is not the format in the system prompt.
+    """
+    user_prompt = f"""
+    {summaries_block(summaries)}Patient timeline (multiple days of answers, JSON-structured):
+    {timeline_format}
     {answers_over_days}
 
     If nothing significant is detected, return an empty JSON: {{}}
     Otherwise, return a dictionary mapping Q-ids to follow-up question strings.
     """
 
-    resp = client.chat.completions.create(
-        model="gpt-5-mini",
+    return dict(
+        model=TREND_FOLLOWUP_MODEL,
         messages=[
-            {"role": "system", "content": system_prompt},
+            {"role": "system", "content": TREND_FOLLOWUP_SYSTEM_PROMPT},
             {"role": "user",   "content": user_prompt}
         ],
         response_format=TREND_FOLLOWUP_DICT_SCHEMA,  # strict dict schema
         max_completion_tokens=5000
     )
 
-    payload = json.loads(resp.choices[0].message.content)  # dict like {"Q1": "..."} or {}
+
+async def generate_trend_followups(answers_over_days: str, summaries=None, timeline_format: str = "",
+                                   provider: Optional[LLMProvider] = None):
+    request = trend_followup_request(answers_over_days, summaries, timeline_format)
+    completion = await llm_complete("generate_trend_followups", request, provider)
+
+    payload = json.loads(completion.content)  # dict like {"Q1": "..."} or {}
     return payload
 
 
+async def stream_completion(request: dict, generator: str = "stream", provider: Optional[LLMProvider] = None):
+    """
+    Yield the text of a chat completion as tokens arrive. Latency is recorded
+    for the whole stream; streamed calls report no token usage.
+    """
+    provider = provider or llm_providers.get_provider()
+    started = time.perf_counter()
+    ok = False
+    try:
+        async for delta in provider.stream(request):
+            yield delta
+        ok = True
+    finally:
+        metrics.record_llm_call(generator, time.perf_counter() - started, ok=ok)
+        profiling.record("llm", started, generator=generator, model=request.get("model"), streamed=True)
+
 
-from fastapi import FastAPI, HTTPException, Depends, Query
+
+from fastapi import FastAPI, HTTPException, Depends, Query, WebSocket, WebSocketDisconnect
 from pydantic import BaseModel
 
 app = FastAPI(
@@ -298,14 +372,39 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(metrics.MetricsMiddleware)
+app.add_middleware(profiling.ProfilingMiddleware)
+
+
+@app.on_event("startup")
+async def startup_llm_client():
+    # LLM_PROVIDER=stub runs every generator offline (benchmarks, load tests)
+    if llm_providers.get_provider().name == "openai":
+        llm_client.init_client()
+
+
+@app.on_event("shutdown")
+async def shutdown_llm_client():
+    await llm_providers.close_provider()
+
+
+@app.on_event("shutdown")
+async def shutdown_async_engine():
+    await async_engine.dispose()
 
 # --- Database setup (SQLite by default) ---
 DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./symptom.db")
-engine = create_engine(
-    DATABASE_URL,
-    connect_args={"check_same_thread": False} if DATABASE_URL.startswith("sqlite") else {},
-)
+engine = make_engine(DATABASE_URL, sqlite_pragmas=sqlite_pragmas_from_env())
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# Async engine on the same database for the chat hot path
+async_engine = make_async_engine(DATABASE_URL, sqlite_pragmas=sqlite_pragmas_from_env())
+AsyncSessionLocal = sessionmaker(async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False)
+metrics.instrument_engine(engine)
+metrics.instrument_engine(async_engine.sync_engine)
+profiling.instrument_engine(engine)
+profiling.instrument_engine(async_engine.sync_engine)
+# Pushes committed chat messages to open /chat/ws connections
+chat_hub = ChatHub()
 Base = declarative_base()
 
 
@@ -321,6 +420,12 @@ class Question(Base):
     created_at = Column(DateTime, nullable=False, default=datetime.utcnow)
     answers = relationship("Answer", back_populates="question")
 
+    __table_args__ = (
+        # One daily set per user and day, even if two requests generate at once.
+        # Also serves the (user_id, q_date) lookups ordered by order_index.
+        Index("uq_questions_user_date_order", "user_id", "q_date", "order_index", unique=True),
+    )
+
 
 class Answer(Base):
     __tablename__ = "answers"
@@ -331,6 +436,11 @@ class Answer(Base):
     created_at = Column(DateTime, nullable=False, default=datetime.utcnow)
     question = relationship("Question", back_populates="answers")
 
+    __table_args__ = (
+        # NOT EXISTS check in next_unanswered_question and the report join
+        Index("ix_answers_question_user", "question_id", "user_id"),
+    )
+
 
 class ChatMessage(Base):
     __tablename__ = "chat_messages"
@@ -342,8 +452,163 @@ class ChatMessage(Base):
     m_date = Column(Date, index=True, nullable=False)
     created_at = Column(DateTime, nullable=False, default=datetime.utcnow)
 
+    __table_args__ = (
+        # /chat/messages: filter on (user_id, m_date), ordered by created_at
+        Index("ix_chat_messages_user_date_created", "user_id", "m_date", "created_at"),
+    )
+
+
+class DailyTimeline(Base):
+    """
+    Materialized report timeline: one document per user and day (see timelines.py),
+    kept current in the same transaction as each change by add_timeline_answer()
+    or refresh_timelines().
+    """
+    __tablename__ = "daily_timelines"
+    user_id = Column(Integer, primary_key=True)
+    t_date = Column(Date, primary_key=True)
+    payload = Column(Text, nullable=False)  # JSON [{"id": 1, "q": "...", "a": [["timestamp", "answer"], ...]}, ...]
+    question_count = Column(Integer, nullable=False, default=0)
+    answer_count = Column(Integer, nullable=False, default=0)
+    revision = Column(Integer, nullable=False, default=1)
+    updated_at = Column(DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+
+class PeriodSummary(Base):
+    """
+    LLM summary of one user's timeline over a calendar week or month, reused by
+    reports and trend follow-ups for history older than the recent raw days.
+    source_key fingerprints the daily_timelines rows it was written from.
+    """
+    __tablename__ = "period_summaries"
+    user_id = Column(Integer, primary_key=True)
+    start_date = Column(Date, primary_key=True)
+    end_date = Column(Date, primary_key=True)
+    source_key = Column(String(64), nullable=False)
+    summary = Column(Text, nullable=False)
+    created_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+
+
+class QuestionSetCache(Base):
+    """
+    Generated daily question sets keyed by sha256(prompt version, model, patient description).
+    """
+    __tablename__ = "question_set_cache"
+    key = Column(String(64), primary_key=True)
+    payload = Column(Text, nullable=False)  # JSON {"Q1": "...", ...}
+    created_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+    last_used_at = Column(DateTime, index=True, nullable=False, default=datetime.utcnow)
+    hits = Column(Integer, nullable=False, default=0)
+
+
+def init_db():
+    """
+    Create missing tables and apply pending migrations. Runs at API startup;
+    CLI scripts call it before touching the database.
+    """
+    run_migrations(engine, Base.metadata)
+
+
+@app.on_event("startup")
+def startup_init_db():
+    init_db()
+
 
-Base.metadata.create_all(bind=engine)
+# --- Materialized report timelines ---
+def _timeline_range(user_ids: List[int], start_d: date, end_d: date):
+    return and_(Question.user_id.in_(user_ids), Question.q_date >= start_d, Question.q_date <= end_d)
+
+
+def timeline_rows_stmt(user_ids: List[int], start_d: date, end_d: date):
+    return (
+        select(Question.user_id, Question.q_date, Question.id, Question.text, Answer.created_at, Answer.text)
+        .outerjoin(Answer, and_(Answer.question_id == Question.id, Answer.user_id == Question.user_id))
+        .where(_timeline_range(user_ids, start_d, end_d))
+        .order_by(Question.user_id, Question.q_date, Question.order_index, Answer.created_at)
+    )
+
+
+def _timeline_refresh_stmts(user_ids: List[int], start_d: date, end_d: date):
+    # Lock the days' questions first (Postgres) so concurrent answers to the same
+    # day rebuild one after the other instead of overwriting each other
+    lock = select(Question.id).where(_timeline_range(user_ids, start_d, end_d)).with_for_update()
+    stored = select(DailyTimeline).where(
+        DailyTimeline.user_id.in_(user_ids), DailyTimeline.t_date >= start_d, DailyTimeline.t_date <= end_d
+    )
+    return lock, timeline_rows_stmt(user_ids, start_d, end_d), stored
+
+
+def _apply_timeline_plan(db, user_ids, start_d, end_d, rows, stored):
+    """
+    Add new DailyTimeline rows to db (updated rows are modified in place);
+    returns a DELETE for days that no longer have questions, or None.
+    """
+    keys = [(u, start_d + timedelta(days=i)) for u in user_ids for i in range((end_d - start_d).days + 1)]
+    _updates, inserts, deletes = timelines.plan_refresh(
+        {(t.user_id, t.t_date): t for t in stored}, timelines.group_rows(rows), keys,
+    )
+    db.add_all([
+        DailyTimeline(
+            user_id=u, t_date=d, payload=payload, question_count=len(doc),
+            answer_count=sum(len(item["a"]) for item in doc), revision=1,
+        )
+        for (u, d), doc, payload in inserts
+    ])
+    if not deletes:
+        return None
+    return delete(DailyTimeline).where(
+        or_(*[and_(DailyTimeline.user_id == u, DailyTimeline.t_date == d) for u, d in deletes])
+    )
+
+
+def refresh_timelines(db: Session, user_ids: List[int], start_d: date, end_d: Optional[date] = None):
+    """
+    Rebuild the stored timelines of user_ids for [start_d, end_d] (one day by
+    default) from their questions and answers. Call it in the transaction that
+    made the change, before commit; pending changes are flushed first.
+    """
+    end_d = end_d or start_d
+    lock, rows_stmt, stored_stmt = _timeline_refresh_stmts(user_ids, start_d, end_d)
+    db.flush()
+    db.execute(lock)
+    rows = db.execute(rows_stmt).all()
+    purge = _apply_timeline_plan(db, user_ids, start_d, end_d, rows, db.scalars(stored_stmt).all())
+    if purge is not None:
+        db.execute(purge)
+
+
+async def add_timeline_answer(db: AsyncSession, q: Question, answer: Answer):
+    """
+    Append a new answer to its day's stored timeline (one row read and written);
+    falls back to rebuilding the day if the row or question is missing.
+    """
+    await db.flush()  # assigns answer.created_at
+    row = await db.scalar(
+        select(DailyTimeline)
+        .where(DailyTimeline.user_id == q.user_id, DailyTimeline.t_date == q.q_date)
+        .with_for_update()
+    )
+    payload = timelines.append_answer(row.payload, q.id, answer.created_at, answer.text) if row else None
+    if payload is None:
+        await refresh_timelines_async(db, [q.user_id], q.q_date)
+        return
+    row.payload = payload
+    row.answer_count += 1
+    row.revision += 1
+
+
+async def refresh_timelines_async(db: AsyncSession, user_ids: List[int], start_d: date, end_d: Optional[date] = None):
+    """
+    refresh_timelines() for the async chat paths.
+    """
+    end_d = end_d or start_d
+    lock, rows_stmt, stored_stmt = _timeline_refresh_stmts(user_ids, start_d, end_d)
+    await db.flush()
+    await db.execute(lock)
+    rows = (await db.execute(rows_stmt)).all()
+    purge = _apply_timeline_plan(db, user_ids, start_d, end_d, rows, (await db.scalars(stored_stmt)).all())
+    if purge is not None:
+        await db.execute(purge)
 
 
 def get_db():
@@ -354,54 +619,299 @@ def get_db():
         db.close()
 
 
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+
 def today() -> date:
     return datetime.utcnow().date()
 
 
-def ensure_todays_questions(db: Session, user_id: int, patient_description: Optional[str] = None):
-    existing = (
-        db.query(Question)
-        .filter(Question.user_id == user_id, Question.q_date == today())
-        .order_by(Question.order_index.asc())
-        .all()
-    )
-    if existing:
-        return existing
+def run_with_session(fn, *args):
+    db = SessionLocal()
+    try:
+        return fn(db, *args)
+    finally:
+        db.close()
 
-    desc = patient_description or "General daily health check"
-    generated = generate_daily_questions(desc)
-    items = []
+
+async def run_db(fn, *args):
+    """
+    Run fn(db, *args) in the thread pool with its own short-lived session.
+
+    Async endpoints that also await the LLM use this instead of Depends(get_db)
+    so that no pooled connection is held while the event loop waits.
+    """
+    return await run_in_threadpool(run_with_session, fn, *args)
+
+
+def has_questions_on(db: Session, user_id: int, q_date: date) -> bool:
+    return (
+        db.query(Question.id)
+        .filter(Question.user_id == user_id, Question.q_date == q_date)
+        .first()
+    ) is not None
+
+
+def has_todays_questions(db: Session, user_id: int) -> bool:
+    return has_questions_on(db, user_id, today())
+
+
+def store_daily_questions(db: Session, user_id: int, q_date: date, generated: dict) -> int:
+    """
+    Persist a generated {"Q1": "...", ...} set as ordered Question rows.
+    Returns the number stored, or 0 if a set for that day already exists.
+    """
     for idx, k in enumerate(sorted(generated.keys(), key=lambda kk: int(kk[1:]))):
-        q = Question(
+        db.add(Question(
             user_id=user_id,
             text=generated[k],
-            q_date=today(),
+            q_date=q_date,
             order_index=idx,
             source="daily",
-        )
-        db.add(q)
-        items.append(q)
+        ))
+    try:
+        refresh_timelines(db, [user_id], q_date)
+        db.commit()
+    except IntegrityError:
+        # Lost the race against another writer (uq_questions_user_date_order)
+        db.rollback()
+        return 0
+    return len(generated)
+
+
+# --- Daily question set cache ---
+QUESTION_CACHE_TTL = timedelta(hours=float(os.getenv("QUESTION_CACHE_TTL_HOURS", "168")))
+QUESTION_CACHE_MAX_ENTRIES = int(os.getenv("QUESTION_CACHE_MAX_ENTRIES", "1000"))
+question_cache_stats = {"hits": 0, "misses": 0}
+
+
+def question_cache_key(patient_description: str) -> str:
+    raw = "\0".join([DAILY_QUESTIONS_PROMPT_VERSION, DAILY_QUESTIONS_MODEL, patient_description.strip()])
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def lookup_question_set(db: Session, key: str) -> Optional[dict]:
+    entry = db.get(QuestionSetCache, key)
+    if entry is None:
+        return None
+    now = datetime.utcnow()
+    if entry.created_at < now - QUESTION_CACHE_TTL:
+        db.delete(entry)
+        db.commit()
+        return None
+    entry.last_used_at = now
+    entry.hits += 1
+    payload = json.loads(entry.payload)
     db.commit()
-    for q in items:
-        db.refresh(q)
-    return (
-        db.query(Question)
-        .filter(Question.user_id == user_id, Question.q_date == today())
-        .order_by(Question.order_index.asc())
+    return payload
+
+
+def store_question_set(db: Session, key: str, questions: dict):
+    """
+    Insert a generated set, then evict expired and least recently used entries.
+    """
+    now = datetime.utcnow()
+    db.merge(QuestionSetCache(key=key, payload=json.dumps(questions), created_at=now, last_used_at=now, hits=0))
+    try:
+        db.commit()
+    except IntegrityError:
+        # Another request stored the same set first
+        db.rollback()
+        return
+
+    db.query(QuestionSetCache).filter(QuestionSetCache.created_at < now - QUESTION_CACHE_TTL).delete(synchronize_session=False)
+    stale = (
+        db.query(QuestionSetCache.key)
+        .order_by(QuestionSetCache.last_used_at.desc())
+        .offset(QUESTION_CACHE_MAX_ENTRIES)
         .all()
     )
+    if stale:
+        db.query(QuestionSetCache).filter(QuestionSetCache.key.in_([k for (k,) in stale])).delete(synchronize_session=False)
+    db.commit()
 
 
-def next_unanswered_question(db: Session, user_id: int):
-    q = (
-        db.query(Question)
-        .filter(Question.user_id == user_id, Question.q_date == today())
-        .filter(~exists().where(and_(Answer.question_id == Question.id, Answer.user_id == user_id)))
+async def get_daily_questions(patient_description: str) -> dict:
+    """
+    generate_daily_questions() behind the persistent question set cache.
+    """
+    key = question_cache_key(patient_description)
+    cached = await run_db(lookup_question_set, key)
+    if cached is not None:
+        question_cache_stats["hits"] += 1
+        return cached
+
+    question_cache_stats["misses"] += 1
+    generated = await generate_daily_questions(patient_description)
+    await run_db(store_question_set, key, generated)
+    return generated
+
+
+# In-flight daily generations keyed by (user_id, q_date); concurrent callers share one task
+_daily_generations: dict = {}
+
+
+async def _generate_and_store(user_id: int, q_date: date, patient_description: str) -> int:
+    if await run_db(has_questions_on, user_id, q_date):
+        return 0
+    generated = await get_daily_questions(patient_description)
+    return await run_db(store_daily_questions, user_id, q_date, generated)
+
+
+async def generate_questions_once(user_id: int, q_date: date, patient_description: Optional[str] = None) -> int:
+    """
+    Generate and store a user's questions for q_date, single-flight per (user_id, q_date).
+
+    A retry or double tap joins the generation already running instead of
+    calling the LLM again; the unique index catches writers in other processes.
+    """
+    key = (user_id, q_date)
+    task = _daily_generations.get(key)
+    if task is None:
+        desc = patient_description or "General daily health check"
+        task = asyncio.ensure_future(_generate_and_store(user_id, q_date, desc))
+        _daily_generations[key] = task
+        task.add_done_callback(lambda _: _daily_generations.pop(key, None))
+    # shield: a caller disconnecting must not cancel the generation others await
+    return await asyncio.shield(task)
+
+
+async def ensure_todays_questions(db: AsyncSession, user_id: int, patient_description: Optional[str] = None):
+    existing = await db.scalar(
+        select(Question.id).where(Question.user_id == user_id, Question.q_date == today()).limit(1)
+    )
+    if existing is not None:
+        return
+    # End the read transaction so no connection is held while the LLM runs
+    await db.rollback()
+    await generate_questions_once(user_id, today(), patient_description)
+
+
+def next_unanswered_question_stmt(user_id: int):
+    return (
+        select(Question)
+        .where(Question.user_id == user_id, Question.q_date == today())
+        .where(~exists().where(and_(Answer.question_id == Question.id, Answer.user_id == user_id)))
         .order_by(Question.order_index.asc())
-        .first()
+        .limit(1)
     )
+
+
+def next_unanswered_question(db: Session, user_id: int):
+    return db.scalars(next_unanswered_question_stmt(user_id)).first()
+
+
+async def mark_next_question_asked(db: AsyncSession, user_id: int):
+    """
+    Return the next unanswered question, recording it in the chat the first time it is asked.
+
+    The question is claimed with a conditional UPDATE, so when parallel calls
+    (a double tap, several tabs) race, only the one that sets asked_at writes
+    and publishes the chat message.
+    """
+    q = (await db.scalars(next_unanswered_question_stmt(user_id))).first()
+    if q and not q.asked_at:
+        claimed = await db.execute(
+            update(Question)
+            .where(Question.id == q.id, Question.asked_at.is_(None))
+            .values(asked_at=datetime.utcnow())
+            .execution_options(synchronize_session="fetch")
+        )
+        if claimed.rowcount != 1:
+            return q  # Another request asked it first and wrote the message
+        msg = ChatMessage(
+            user_id=user_id,
+            role="assistant",
+            content=q.text,
+            question_id=q.id,
+            m_date=today(),
+        )
+        db.add(msg)
+        await db.commit()
+        chat_hub.publish(user_id, {"type": "message", "message": message_dict(msg)})
     return q
 
+
+async def record_answer(db: AsyncSession, user_id: int, question_id: int, answer_text: str) -> bool:
+    """
+    Store an answer and its chat message; False if the question does not belong to the user.
+    """
+    q = await db.scalar(
+        select(Question).where(Question.id == question_id, Question.user_id == user_id)
+    )
+    if not q:
+        return False
+
+    answer = Answer(user_id=user_id, question_id=q.id, text=answer_text)
+    db.add(answer)
+    msg = ChatMessage(user_id=user_id, role="user", content=answer_text, question_id=q.id, m_date=today())
+    db.add(msg)
+    await add_timeline_answer(db, q, answer)
+    await db.commit()
+    chat_hub.publish(user_id, {"type": "message", "message": message_dict(msg)})
+    return True
+
+
+# Serializes answer-and-advance per user within this process; the row lock covers other workers
+_answer_locks = weakref.WeakValueDictionary()
+
+
+async def answer_and_advance(db: AsyncSession, user_id: int, question_id: int, answer_text: str):
+    """
+    Record an answer and ask the next question in a single transaction.
+
+    Returns (status, next_question) with status "answered", "already_answered"
+    (a retried submission; nothing is written twice) or "not_found".
+    """
+    lock = _answer_locks.get(user_id)
+    if lock is None:
+        lock = _answer_locks[user_id] = asyncio.Lock()
+
+    async with lock:
+        q = await db.scalar(
+            select(Question)
+            .where(Question.id == question_id, Question.user_id == user_id)
+            .with_for_update()
+        )
+        if not q:
+            await db.rollback()
+            return "not_found", None
+
+        already = await db.scalar(
+            select(Answer.id).where(Answer.question_id == q.id, Answer.user_id == user_id).limit(1)
+        )
+        new_msgs = []
+        if already is None:
+            answer = Answer(user_id=user_id, question_id=q.id, text=answer_text)
+            db.add(answer)
+            new_msgs.append(ChatMessage(user_id=user_id, role="user", content=answer_text, question_id=q.id, m_date=today()))
+            db.add(new_msgs[-1])
+            await add_timeline_answer(db, q, answer)  # flushes, so the NOT EXISTS below sees this answer
+
+        nxt = (await db.scalars(next_unanswered_question_stmt(user_id))).first()
+        if nxt and not nxt.asked_at:
+            nxt.asked_at = datetime.utcnow()
+            new_msgs.append(ChatMessage(user_id=user_id, role="assistant", content=nxt.text, question_id=nxt.id, m_date=today()))
+            db.add(new_msgs[-1])
+        await db.commit()
+
+    for msg in new_msgs:
+        chat_hub.publish(user_id, {"type": "message", "message": message_dict(msg)})
+    return ("answered" if already is None else "already_answered"), nxt
+
+
+def message_dict(m: ChatMessage) -> dict:
+    return {
+        "id": m.id,
+        "role": m.role,
+        "content": m.content,
+        "question_id": m.question_id,
+        "date": m.m_date.isoformat(),
+        "created_at": m.created_at.isoformat() + "Z",
+    }
+
 # --- Request body model ---
 class PatientDescription(BaseModel):
     description: str
@@ -413,7 +923,7 @@ async def generate_questions(data: PatientDescription):
     POST endpoint for generating daily health monitoring questions.
     """
     try:
-        result = generate_daily_questions(data.description)
+        result = await generate_daily_questions(data.description)
         return {"status": "success", "questions": result}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -427,7 +937,7 @@ class SeedQuestionsRequest(BaseModel):
 
 
 @app.post("/admin/seed_questions")
-async def admin_seed_questions(payload: SeedQuestionsRequest, db: Session = Depends(get_db)):
+def admin_seed_questions(payload: SeedQuestionsRequest, db: Session = Depends(get_db)):
     try:
         d = today()
         if payload.reset_today:
@@ -440,17 +950,25 @@ async def admin_seed_questions(payload: SeedQuestionsRequest, db: Session = Depe
                 db.query(Answer).filter(Answer.user_id == payload.user_id, Answer.question_id.in_(q_ids)).delete(synchronize_session=False)
                 db.query(ChatMessage).filter(ChatMessage.user_id == payload.user_id, ChatMessage.m_date == d).delete(synchronize_session=False)
                 db.query(Question).filter(Question.user_id == payload.user_id, Question.q_date == d).delete(synchronize_session=False)
+                refresh_timelines(db, [payload.user_id], d)
                 db.commit()
 
-        # insert new questions
-        for idx, text in enumerate(payload.questions):
+        # insert new questions after any that are kept
+        start = (
+            db.query(func.max(Question.order_index))
+            .filter(Question.user_id == payload.user_id, Question.q_date == d)
+            .scalar()
+        )
+        start = 0 if start is None else start + 1
+        for idx, text in enumerate(payload.questions, start=start):
             db.add(Question(
                 user_id=payload.user_id,
                 text=text,
-                q_date=today(),
+                q_date=d,
                 order_index=idx,
                 source="daily",
             ))
+        refresh_timelines(db, [payload.user_id], d)
         db.commit()
         return {"status": "success", "inserted": len(payload.questions)}
     except Exception as e:
@@ -462,7 +980,7 @@ class ResetTodayRequest(BaseModel):
 
 
 @app.post("/admin/reset_today")
-async def admin_reset_today(payload: ResetTodayRequest, db: Session = Depends(get_db)):
+def admin_reset_today(payload: ResetTodayRequest, db: Session = Depends(get_db)):
     try:
         d = today()
         todays_qs = (
@@ -473,11 +991,147 @@ async def admin_reset_today(payload: ResetTodayRequest, db: Session = Depends(ge
             db.query(Answer).filter(Answer.user_id == payload.user_id, Answer.question_id.in_(q_ids)).delete(synchronize_session=False)
         db.query(ChatMessage).filter(ChatMessage.user_id == payload.user_id, ChatMessage.m_date == d).delete(synchronize_session=False)
         db.query(Question).filter(Question.user_id == payload.user_id, Question.q_date == d).delete(synchronize_session=False)
+        refresh_timelines(db, [payload.user_id], d)
         db.commit()
         return {"status": "success"}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+# --- Bulk seeding (load tests, offline question source) ---
+SAMPLE_ANSWERS = [
+    "I feel good today, no major issues",
+    "Slight discomfort in the morning, but improved throughout the day",
+    "Energy level is about 7/10",
+    "Sleep was restful, about 8 hours",
+    "Appetite is normal, eating regularly",
+    "No new symptoms observed",
+    "Pain level is around 3/10",
+    "Feeling better than yesterday",
+    "Some fatigue in the afternoon",
+    "Overall condition is stable",
+]
+
+
+def bulk_seed(
+    db: Session,
+    user_ids: List[int],
+    end_d: date,
+    days: int,
+    questions_per_day: int = 6,
+    answer_rate: float = 1.0,
+    seed: int = 0,
+    batch_users: int = 100,
+) -> dict:
+    """
+    Insert questions, answers and chat messages for every user over the `days`
+    days ending at end_d, using executemany inserts per batch of users. Question
+    sets come from the stub LLM provider's bank (llm_providers.stub_question_set).
+    Same arguments give the same data; user/days that already have questions are skipped.
+    """
+    rng = random.Random(seed)
+    start_d = end_d - timedelta(days=days - 1)
+    counts = {"questions": 0, "answers": 0, "messages": 0, "skipped_days": 0}
+
+    for b in range(0, len(user_ids), batch_users):
+        batch = user_ids[b:b + batch_users]
+        in_batch = and_(Question.user_id.in_(batch), Question.q_date >= start_d, Question.q_date <= end_d)
+        existing = set(db.execute(select(Question.user_id, Question.q_date).where(in_batch).distinct()).all())
+
+        q_rows = []
+        for user_id in batch:
+            for offset in range(days):
+                d = start_d + timedelta(days=offset)
+                if (user_id, d) in existing:
+                    counts["skipped_days"] += 1
+                    continue
+                base = datetime.combine(d, datetime.min.time()) + timedelta(hours=9)
+                for idx, text in enumerate(llm_providers.stub_question_set(rng, questions_per_day).values()):
+                    q_rows.append({
+                        "user_id": user_id, "text": text, "q_date": d, "order_index": idx,
+                        "source": "daily", "asked_at": base + timedelta(minutes=idx * 5), "created_at": base,
+                    })
+        if not q_rows:
+            continue
+        db.execute(insert(Question), q_rows)
+
+        # Read back the new ids via the (user_id, q_date, order_index) index
+        a_rows, m_rows = [], []
+        for q_id, user_id, d, idx, text, asked_at in db.execute(
+            select(Question.id, Question.user_id, Question.q_date, Question.order_index, Question.text, Question.asked_at)
+            .where(in_batch)
+            .order_by(Question.id)
+        ):
+            if (user_id, d) in existing:
+                continue
+            m_rows.append({"user_id": user_id, "role": "assistant", "content": text,
+                           "question_id": q_id, "m_date": d, "created_at": asked_at})
+            if rng.random() >= answer_rate:
+                continue
+            answer = rng.choice(SAMPLE_ANSWERS)
+            answered_at = asked_at + timedelta(minutes=2)
+            a_rows.append({"user_id": user_id, "question_id": q_id, "text": answer, "created_at": answered_at})
+            m_rows.append({"user_id": user_id, "role": "user", "content": answer,
+                           "question_id": q_id, "m_date": d, "created_at": answered_at})
+        if a_rows:
+            db.execute(insert(Answer), a_rows)
+        db.execute(insert(ChatMessage), m_rows)
+        refresh_timelines(db, batch, start_d, end_d)
+        db.commit()
+
+        counts["questions"] += len(q_rows)
+        counts["answers"] += len(a_rows)
+        counts["messages"] += len(m_rows)
+    return counts
+
+
+class SeedBulkRequest(BaseModel):
+    user_ids: Optional[List[int]] = None
+    users: int = 1                   # used when user_ids is not given: first_user_id .. +users-1
+    first_user_id: int = 1
+    days: int = 30
+    end_date: Optional[str] = None   # YYYY-MM-DD, defaults to today
+    questions_per_day: int = 6
+    answer_rate: float = 1.0
+    seed: int = 0
+
+
+@app.post("/admin/seed_bulk")
+def admin_seed_bulk(payload: SeedBulkRequest, db: Session = Depends(get_db)):
+    try:
+        user_ids = payload.user_ids or list(range(payload.first_user_id, payload.first_user_id + payload.users))
+        end_d = datetime.strptime(payload.end_date, "%Y-%m-%d").date() if payload.end_date else today()
+        counts = bulk_seed(
+            db, user_ids, end_d, payload.days,
+            questions_per_day=payload.questions_per_day,
+            answer_rate=payload.answer_rate,
+            seed=payload.seed,
+        )
+        return {"status": "success", "users": len(user_ids), **counts}
+    except Exception as e:
+        db.rollback()
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.get("/metrics")
+def get_metrics():
+    """
+    Prometheus text format; see metrics.py for the series.
+    """
+    return PlainTextResponse(metrics.registry.render(), media_type="text/plain; version=0.0.4")
+
+
+@app.get("/admin/question_cache")
+def admin_question_cache(db: Session = Depends(get_db)):
+    lookups = question_cache_stats["hits"] + question_cache_stats["misses"]
+    return {
+        "hits": question_cache_stats["hits"],
+        "misses": question_cache_stats["misses"],
+        "hit_rate": question_cache_stats["hits"] / lookups if lookups else 0.0,
+        "entries": db.query(QuestionSetCache).count(),
+        "max_entries": QUESTION_CACHE_MAX_ENTRIES,
+        "ttl_hours": QUESTION_CACHE_TTL.total_seconds() / 3600,
+    }
+
 # --- Request body model ---
 class FollowupRequest(BaseModel):
     answers: str
@@ -490,7 +1144,7 @@ async def generate_followup(data: FollowupRequest):
     POST endpoint for generating intelligent medical follow-up questions.
     """
     try:
-        result = generate_followup_questions(data.answers, data.symptoms)
+        result = await generate_followup_questions(data.answers, data.symptoms)
         return {"status": "success", "followup_questions": result}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -498,15 +1152,62 @@ async def generate_followup(data: FollowupRequest):
 
 # --- Request body ---
 class TrendRequest(BaseModel):
-    answers_over_days: str
+    answers_over_days: Optional[str] = None
+    # Or let the server build the history: the user's last `days` days, older periods summarized
+    user_id: Optional[int] = None
+    days: int = 90
+
+
+def fit_client_trend_timeline(answers_over_days: str) -> str:
+    """
+    Minify a client-sent {question: {"A1": "timestamp, answer", ...}} timeline and, while
+    the prompt is over PROMPT_TOKEN_BUDGET, keep fewer (the latest) answers per question.
+    Anything else is passed through as sent.
+    """
+    try:
+        timeline = json.loads(answers_over_days)
+    except ValueError:
+        return answers_over_days
+    if not isinstance(timeline, dict) or not all(isinstance(a, dict) for a in timeline.values()):
+        return timelines.dumps(timeline)
+
+    def latest(n: int) -> str:
+        return timelines.dumps({q: dict(list(answers.items())[-n:]) for q, answers in timeline.items()})
+
+    longest = max((len(answers) for answers in timeline.values()), default=0)
+    keep = token_budget.largest_fitting(lambda n: trend_followup_request(latest(n)), longest, n_min=1)
+    return latest(keep)
 
 
+async def trend_inputs(data: TrendRequest):
+    """
+    (answers_over_days, summaries, timeline_format) for a trend request, within PROMPT_TOKEN_BUDGET.
+    """
+    if data.answers_over_days is not None:
+        return fit_client_trend_timeline(data.answers_over_days), [], ""
+    if data.user_id is None:
+        raise HTTPException(status_code=400, detail="Provide answers_over_days or user_id")
+    end_d = today()
+    start_d = end_d - timedelta(days=max(data.days, 1) - 1)
+
+    def request(days, summaries):
+        return trend_followup_request(timelines.dumps(timelines.compact_answers(days)), summaries,
+                                      timelines.COMPACT_ANSWERS_FORMAT)
+
+    days, summaries = await prompt_history(data.user_id, start_d, end_d, request, "trend_timeline")
+    if not days and not summaries:
+        raise HTTPException(status_code=404, detail="No data found in date range")
+    return timelines.dumps(timelines.compact_answers(days)), summaries, timelines.COMPACT_ANSWERS_FORMAT
+
 
 @app.post("/generate_trend_followups")
 async def trend_followups_api(data: TrendRequest):
     try:
-        result = generate_trend_followups(data.answers_over_days)
+        answers_over_days, summaries, timeline_format = await trend_inputs(data)
+        result = await generate_trend_followups(answers_over_days, summaries, timeline_format)
         return {"status": "success", "trend_followup_questions": result}
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -527,7 +1228,7 @@ class SessionQuestionItem(BaseModel):
 async def session_generate_daily_questions(session_id: str, payload: SessionQuestionGenRequest):
     try:
         desc = payload.patient_description or "General daily health check"
-        result = generate_daily_questions(desc)  # dict {"Q1": "...", ...}
+        result = await get_daily_questions(desc)  # dict {"Q1": "...", ...}
         # Return a stable, ordered list so client can store orderIndex
         items = []
         for k in sorted(result.keys(), key=lambda kk: int(kk[1:])):
@@ -549,32 +1250,21 @@ class InitSessionRequest(BaseModel):
 
 
 @app.post("/init_daily_session")
-async def init_daily_session(payload: InitSessionRequest, db: Session = Depends(get_db)):
+async def init_daily_session(payload: InitSessionRequest):
     try:
         user_id = payload.user_id
         d = today()
         
         # Check if questions already exist for today
-        existing = db.query(Question).filter(Question.user_id == user_id, Question.q_date == d).first()
-        if existing:
+        if await run_db(has_todays_questions, user_id):
             return {"status": "already_initialized", "message": "Questions already exist for today"}
         
-        # Generate questions via GPT
-        desc = payload.patient_description or "General daily health check"
-        generated = generate_daily_questions(desc)
-        
-        # Store in database
-        for idx, key in enumerate(sorted(generated.keys(), key=lambda k: int(k[1:]))):
-            db.add(Question(
-                user_id=user_id,
-                text=generated[key],
-                q_date=d,
-                order_index=idx,
-                source="daily",
-            ))
-        db.commit()
+        # Generate questions via GPT and store them
+        stored = await generate_questions_once(user_id, d, payload.patient_description)
+        if not stored:
+            return {"status": "already_initialized", "message": "Questions already exist for today"}
         
-        return {"status": "success", "message": f"Generated and stored {len(generated)} questions"}
+        return {"status": "success", "message": f"Generated and stored {stored} questions"}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -591,25 +1281,14 @@ class NextQuestionResponse(BaseModel):
 
 
 @app.post("/chat/next-question", response_model=NextQuestionResponse)
-async def get_next_question(payload: NextQuestionRequest, db: Session = Depends(get_db)):
+async def get_next_question(payload: NextQuestionRequest, db: AsyncSession = Depends(get_async_db)):
     try:
-        ensure_todays_questions(db, payload.user_id, payload.patient_description)
-        q = next_unanswered_question(db, payload.user_id)
+        with metrics.timed("ensure_todays_questions"):
+            await ensure_todays_questions(db, payload.user_id, payload.patient_description)
+        q = await mark_next_question_asked(db, payload.user_id)
         if not q:
             raise HTTPException(status_code=204, detail="No more questions for today")
 
-        if not q.asked_at:
-            q.asked_at = datetime.utcnow()
-            db.add(ChatMessage(
-                user_id=payload.user_id,
-                role="assistant",
-                content=q.text,
-                question_id=q.id,
-                m_date=today(),
-            ))
-            db.commit()
-            db.refresh(q)
-
         return NextQuestionResponse(question_id=q.id, text=q.text)
     except HTTPException:
         raise
@@ -624,15 +1303,10 @@ class AnswerRequest(BaseModel):
 
 
 @app.post("/chat/answer")
-async def submit_answer(payload: AnswerRequest, db: Session = Depends(get_db)):
+async def submit_answer(payload: AnswerRequest, db: AsyncSession = Depends(get_async_db)):
     try:
-        q = db.query(Question).filter(Question.id == payload.question_id, Question.user_id == payload.user_id).first()
-        if not q:
+        if not await record_answer(db, payload.user_id, payload.question_id, payload.answer_text):
             raise HTTPException(status_code=404, detail="Question not found for user")
-
-        db.add(Answer(user_id=payload.user_id, question_id=q.id, text=payload.answer_text))
-        db.add(ChatMessage(user_id=payload.user_id, role="user", content=payload.answer_text, question_id=q.id, m_date=today()))
-        db.commit()
         return {"status": "success"}
     except HTTPException:
         raise
@@ -640,43 +1314,230 @@ async def submit_answer(payload: AnswerRequest, db: Session = Depends(get_db)):
         raise HTTPException(status_code=500, detail=str(e))
 
 
+class AnswerAndNextRequest(BaseModel):
+    user_id: int
+    question_id: int
+    answer_text: str
+
+
+@app.post("/chat/answer-and-next")
+async def submit_answer_and_next(payload: AnswerAndNextRequest, db: AsyncSession = Depends(get_async_db)):
+    """
+    /chat/answer followed by /chat/next-question in one round trip and one transaction.
+    "next" is null once today's questions are all answered.
+    """
+    try:
+        status, nxt = await answer_and_advance(db, payload.user_id, payload.question_id, payload.answer_text)
+        if status == "not_found":
+            raise HTTPException(status_code=404, detail="Question not found for user")
+        return {
+            "status": status,
+            "next": NextQuestionResponse(question_id=nxt.id, text=nxt.text) if nxt else None,
+        }
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+def chat_messages_stmt(
+    user_id: int,
+    start_d: date,
+    end_d: Optional[date] = None,
+    after_id: Optional[int] = None,
+    since: Optional[datetime] = None,
+    limit: Optional[int] = None,
+):
+    """
+    Messages for one day (or the inclusive range start_d..end_d) in chat order,
+    optionally only those after a cursor. Served by ix_chat_messages_user_date_created.
+
+    after_id is a keyset cursor: rows come after the cursor message in
+    (m_date, created_at, id) order, so paging from the last message returned
+    never skips one even when a day was backfilled after the days following
+    it (ids are then out of chat order). The cursor must be one of the
+    user's messages; another user's id matches nothing, and an id that no
+    longer exists falls back to id > after_id. since pages on created_at,
+    so its rows are ordered by created_at.
+    """
+    stmt = select(ChatMessage).where(ChatMessage.user_id == user_id)
+    if end_d is None:
+        stmt = stmt.where(ChatMessage.m_date == start_d)
+    else:
+        stmt = stmt.where(ChatMessage.m_date >= start_d, ChatMessage.m_date <= end_d)
+    if after_id is not None:
+        cursor = aliased(ChatMessage)
+        own_cursor = and_(cursor.id == after_id, cursor.user_id == user_id)
+        cursor_date = select(cursor.m_date).where(own_cursor).scalar_subquery()
+        cursor_created = select(cursor.created_at).where(own_cursor).scalar_subquery()
+        stmt = stmt.where(or_(
+            tuple_(ChatMessage.m_date, ChatMessage.created_at, ChatMessage.id)
+            > tuple_(cursor_date, cursor_created, after_id),
+            and_(~exists().where(cursor.id == after_id), ChatMessage.id > after_id),
+        ))
+    if since is not None and after_id is None:
+        stmt = stmt.order_by(ChatMessage.created_at.asc(), ChatMessage.id.asc())
+    else:
+        stmt = stmt.order_by(ChatMessage.m_date.asc(), ChatMessage.created_at.asc(), ChatMessage.id.asc())
+    if since is not None:
+        stmt = stmt.where(ChatMessage.created_at > since)
+    if limit is not None:
+        stmt = stmt.limit(limit)
+    return stmt
+
+
+def parse_query_date(value: str) -> date:
+    try:
+        return datetime.strptime(value, "%Y-%m-%d").date()
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid date format. Use YYYY-MM-DD")
+
+
 @app.get("/chat/messages")
 async def get_messages(
     user_id: int = Query(...),
     for_date: Optional[str] = Query(None),
-    db: Session = Depends(get_db),
+    start_date: Optional[str] = Query(None, description="Range mode: first day (YYYY-MM-DD), use with end_date"),
+    end_date: Optional[str] = Query(None, description="Range mode: last day (YYYY-MM-DD), inclusive"),
+    after_id: Optional[int] = Query(None, description="Only messages with id greater than this cursor"),
+    since: Optional[str] = Query(None, description="Only messages created after this ISO timestamp"),
+    limit: Optional[int] = Query(None, ge=1, le=1000),
+    db: AsyncSession = Depends(get_async_db),
 ):
+    """
+    Chat messages for a day, or for a date range (calendar view).
+
+    For incremental sync pass the id of the last message already held as
+    after_id (or its created_at as since) and, optionally, a page size.
+    """
     try:
-        if for_date:
+        if start_date or end_date:
+            if not (start_date and end_date):
+                raise HTTPException(status_code=400, detail="start_date and end_date must be given together")
+            start_d, end_d = parse_query_date(start_date), parse_query_date(end_date)
+            if end_d < start_d:
+                raise HTTPException(status_code=400, detail="end_date is before start_date")
+        else:
+            start_d, end_d = (parse_query_date(for_date) if for_date else today()), None
+
+        since_dt = None
+        if since:
             try:
-                d = datetime.strptime(for_date, "%Y-%m-%d").date()
+                since_dt = datetime.fromisoformat(since.rstrip("Z"))
             except ValueError:
-                raise HTTPException(status_code=400, detail="Invalid date format. Use YYYY-MM-DD")
-        else:
-            d = today()
+                raise HTTPException(status_code=400, detail="Invalid since timestamp. Use ISO 8601")
 
-        msgs = (
-            db.query(ChatMessage)
-            .filter(ChatMessage.user_id == user_id, ChatMessage.m_date == d)
-            .order_by(ChatMessage.created_at.asc())
-            .all()
-        )
-        return [
-            {
-                "id": m.id,
-                "role": m.role,
-                "content": m.content,
-                "question_id": m.question_id,
-                "created_at": m.created_at.isoformat() + "Z",
-            }
-            for m in msgs
-        ]
+        if after_id is not None:
+            owner = await db.scalar(select(ChatMessage.user_id).where(ChatMessage.id == after_id))
+            if owner is not None and owner != user_id:
+                raise HTTPException(status_code=400, detail="after_id is not one of this user's messages")
+
+        msgs = (await db.scalars(chat_messages_stmt(user_id, start_d, end_d, after_id, since_dt, limit))).all()
+        return [message_dict(m) for m in msgs]
     except HTTPException:
         raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
+# --- Streaming chat channel ---
+async def push_next_question(websocket: WebSocket, user_id: int, patient_description: Optional[str]):
+    """
+    Ask the next question over the socket (its ChatMessage arrives via the hub), or report that the day is done.
+    """
+    async with AsyncSessionLocal() as db:
+        await ensure_todays_questions(db, user_id, patient_description)
+        q = await mark_next_question_asked(db, user_id)
+    if q:
+        await websocket.send_json({"type": "question", "question_id": q.id, "text": q.text})
+    else:
+        await websocket.send_json({"type": "done", "detail": "No more questions for today"})
+
+
+@app.websocket("/chat/ws/{user_id}")
+async def chat_socket(
+    websocket: WebSocket,
+    user_id: int,
+    patient_description: Optional[str] = None,
+    after_id: Optional[int] = None,
+):
+    """
+    One connection per chat session instead of answer / next-question / messages round trips.
+
+    Client -> server: {"type": "answer", "question_id": 1, "answer_text": "..."}
+    Server -> client: {"type": "message", "message": {...}} for every committed ChatMessage,
+                      {"type": "question", ...} / {"type": "done"} after each answer,
+                      {"type": "error", "detail": "..."} for rejected input or a failed
+                      step (e.g. question generation); the connection stays open.
+    Pass after_id to replay today's messages the client has not seen yet.
+    """
+    await websocket.accept()
+    events = chat_hub.subscribe(user_id)
+
+    async def forward_events():
+        while True:
+            await websocket.send_json(await events.get())
+
+    async def send_error(detail: str):
+        await websocket.send_json({"type": "error", "detail": detail})
+
+    async def handle_client():
+        if after_id is not None:
+            async with AsyncSessionLocal() as db:
+                missed = (await db.scalars(chat_messages_stmt(user_id, today(), after_id=after_id))).all()
+            for m in missed:
+                await websocket.send_json({"type": "message", "message": message_dict(m)})
+        try:
+            await push_next_question(websocket, user_id, patient_description)
+        except WebSocketDisconnect:
+            raise
+        except Exception as e:
+            await send_error(str(e))
+
+        while True:
+            try:
+                data = json.loads(await websocket.receive_text())
+            except ValueError:
+                await send_error("Messages must be JSON")
+                continue
+            if not isinstance(data, dict) or data.get("type") != "answer":
+                await send_error("Unknown message type")
+                continue
+            try:
+                question_id = int(data["question_id"])
+                answer_text = str(data["answer_text"])
+            except (KeyError, TypeError, ValueError):
+                await send_error("answer needs question_id and answer_text")
+                continue
+            try:
+                async with AsyncSessionLocal() as db:
+                    status, nxt = await answer_and_advance(db, user_id, question_id, answer_text)
+            except WebSocketDisconnect:
+                raise
+            except Exception as e:
+                await send_error(str(e))
+                continue
+            if status == "not_found":
+                await send_error("Question not found for user")
+            elif nxt:
+                await websocket.send_json({"type": "question", "question_id": nxt.id, "text": nxt.text})
+            else:
+                await websocket.send_json({"type": "done", "detail": "No more questions for today"})
+
+    tasks = [asyncio.create_task(forward_events()), asyncio.create_task(handle_client())]
+    try:
+        done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+        for task in done:
+            if not task.cancelled() and not isinstance(task.exception(), WebSocketDisconnect):
+                task.result()
+    except WebSocketDisconnect:
+        pass
+    finally:
+        for task in tasks:
+            task.cancel()
+        chat_hub.unsubscribe(user_id, events)
+
+
 # --- PDF Report Generation ---
 class GenerateReportRequest(BaseModel):
     user_id: int = 1
@@ -684,8 +1545,40 @@ class GenerateReportRequest(BaseModel):
     end_date: Optional[str] = None    # YYYY-MM-DD
 
 
+def parse_report_range(payload: GenerateReportRequest):
+    if payload.start_date:
+        start_d = datetime.strptime(payload.start_date, "%Y-%m-%d").date()
+    else:
+        start_d = date(2000, 1, 1)  # far past
+    
+    if payload.end_date:
+        end_d = datetime.strptime(payload.end_date, "%Y-%m-%d").date()
+    else:
+        end_d = today()
+    return start_d, end_d
+
+
+def load_timeline_days(db: Session, user_id: int, start_d: date, end_d: date):
+    """
+    [(day, document), ...] for the range from daily_timelines: one primary-key range scan.
+    """
+    rows = db.execute(
+        select(DailyTimeline.t_date, DailyTimeline.payload)
+        .where(DailyTimeline.user_id == user_id, DailyTimeline.t_date >= start_d, DailyTimeline.t_date <= end_d)
+        .order_by(DailyTimeline.t_date)
+    )
+    return [(day, json.loads(payload)) for day, payload in rows]
+
+
+def build_answer_timeline(db: Session, user_id: int, start_d: date, end_d: date):
+    """
+    Collect {question: {"A1": "timestamp, answer", ...}} for the JSON report, or None if there is no data.
+    """
+    return timelines.answer_timeline(load_timeline_days(db, user_id, start_d, end_d))
+
+
 @app.post("/generate_report_json")
-async def generate_report_json(
+def generate_report_json(
     payload: GenerateReportRequest,
     db: Session = Depends(get_db)
 ):
@@ -696,52 +1589,13 @@ async def generate_report_json(
     try:
         user_id = payload.user_id
         
-        # Parse date range
-        if payload.start_date:
-            start_d = datetime.strptime(payload.start_date, "%Y-%m-%d").date()
-        else:
-            start_d = date(2000, 1, 1)  # far past
-        
-        if payload.end_date:
-            end_d = datetime.strptime(payload.end_date, "%Y-%m-%d").date()
-        else:
-            end_d = today()
-        
-        # Get all questions in date range
-        questions = (
-            db.query(Question)
-            .filter(
-                Question.user_id == user_id,
-                Question.q_date >= start_d,
-                Question.q_date <= end_d
-            )
-            .order_by(Question.q_date.asc(), Question.order_index.asc())
-            .all()
-        )
+        start_d, end_d = parse_report_range(payload)
         
-        if not questions:
+        with metrics.timed("report_json_build"):
+            result = build_answer_timeline(db, user_id, start_d, end_d)
+        if result is None:
             return {"status": "no_data", "message": "No questions found in date range"}
         
-        # Build the structure
-        result = {}
-        
-        for q in questions:
-            q_text = q.text
-            if q_text not in result:
-                result[q_text] = {}
-            
-            # Get answers for this question
-            answers = (
-                db.query(Answer)
-                .filter(Answer.question_id == q.id, Answer.user_id == user_id)
-                .order_by(Answer.created_at.asc())
-                .all()
-            )
-            
-            for idx, ans in enumerate(answers, start=1):
-                timestamp = ans.created_at.strftime("%Y-%m-%d %H:%M:%S")
-                result[q_text][f"A{idx}"] = f"{timestamp}, {ans.text}"
-        
         return {
             "status": "success",
             "data": result,
@@ -754,81 +1608,94 @@ async def generate_report_json(
         raise HTTPException(status_code=500, detail=str(e))
 
 
-@app.post("/generate_report_pdf")
-async def generate_report_pdf(
-    payload: GenerateReportRequest,
-    db: Session = Depends(get_db)
-):
+def build_daily_timeline(db: Session, user_id: int, start_d: date, end_d: date):
     """
-    Generate PDF report from database and return file for download.
+    Collect {date: {question: answer}} for the PDF report, or None if there is no data.
     """
-    try:
-        user_id = payload.user_id
-        
-        # Parse date range
-        if payload.start_date:
-            start_d = datetime.strptime(payload.start_date, "%Y-%m-%d").date()
-        else:
-            start_d = date(2000, 1, 1)
-        
-        if payload.end_date:
-            end_d = datetime.strptime(payload.end_date, "%Y-%m-%d").date()
-        else:
-            end_d = today()
-        
-        # Get all questions in date range
-        questions = (
-            db.query(Question)
-            .filter(
-                Question.user_id == user_id,
-                Question.q_date >= start_d,
-                Question.q_date <= end_d
-            )
-            .order_by(Question.q_date.asc(), Question.order_index.asc())
-            .all()
-        )
-        
-        if not questions:
-            raise HTTPException(status_code=404, detail="No data found in date range")
-        
-        # Build the JSON structure organized by DATE first, then questions
-        json_data = {}
-        
-        for q in questions:
-            q_date = q.q_date.isoformat()  # Date as key
-            q_text = q.text
-            
-            if q_date not in json_data:
-                json_data[q_date] = {}
-            
-            answers = (
-                db.query(Answer)
-                .filter(Answer.question_id == q.id, Answer.user_id == user_id)
-                .order_by(Answer.created_at.asc())
-                .all()
-            )
+    return timelines.daily_timeline(load_timeline_days(db, user_id, start_d, end_d))
+
+
+def render_report_pdf(report_text: str) -> bytes:
+    """
+    Lay out the LLM report text with ReportLab and return the PDF bytes.
+    """
+    # Imported here: ReportLab is only needed by the report workers, not at API startup
+    from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer
+    from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+    from reportlab.lib.pagesizes import LETTER
+    from reportlab.lib.units import inch
+
+    styles = getSampleStyleSheet()
+    body = ParagraphStyle(
+        "Body",
+        parent=styles["BodyText"],
+        leading=14,
+        spaceAfter=8
+    )
+    heading = ParagraphStyle(
+        "Heading",
+        parent=styles["Heading2"],
+        spaceBefore=6,
+        spaceAfter=6
+    )
+    title = ParagraphStyle(
+        "Title",
+        parent=styles["Heading1"],
+        alignment=1,
+        spaceAfter=12
+    )
+    
+    def to_flow(report: str):
+        flow = []
+        chunks = [c.strip() for c in report.split("\n\n") if c.strip()]
+        for block in chunks:
+            if block.startswith("**") and block.endswith("**") and len(block) > 4:
+                flow.append(Paragraph(block.strip("* "), title))
+                flow.append(Spacer(1, 0.15 * inch))
+                continue
             
-            # Store question and its answer for this date
-            if answers:
-                json_data[q_date][q_text] = answers[0].text  # One answer per question per day
-        
-        # Generate PDF using GPT analysis
-        pdf_filename = f"patient_report_{user_id}_{end_d.isoformat()}.pdf"
-        pdf_path = os.path.join(os.getcwd(), pdf_filename)
-        
-        # Call GPT to analyze and generate report
-        KEY = os.getenv("OPENAI_API_KEY")
-        if not KEY:
-            raise HTTPException(status_code=500, detail="OPENAI_API_KEY not configured")
-        
-        client = OpenAI(api_key=KEY)
-        json_string = json.dumps(json_data, indent=2)
-        
-        system_prompt = """
+            lines = block.splitlines()
+            if lines and lines[0].startswith("**") and lines[0].endswith("**"):
+                flow.append(Paragraph(lines[0].strip("* "), heading))
+                rest = "\n".join(lines[1:]).strip()
+                if rest:
+                    flow.append(Paragraph(rest.replace("\n", "<br/>"), body))
+                flow.append(Spacer(1, 0.12 * inch))
+            else:
+                flow.append(Paragraph(block.replace("\n", "<br/>"), body))
+        return flow
+    
+    buffer = io.BytesIO()
+    doc = SimpleDocTemplate(
+        buffer,
+        pagesize=LETTER,
+        leftMargin=0.9 * inch,
+        rightMargin=0.9 * inch,
+        topMargin=0.8 * inch,
+        bottomMargin=0.8 * inch,
+        title="Patient Summary Report",
+        author="Health Assistant AI"
+    )
+    
+    flowables = to_flow(report_text)
+    if not flowables:
+        flowables = [Paragraph("Patient Summary Report", title)]
+    
+    with metrics.timed("pdf_build"):
+        doc.build(flowables)
+    return buffer.getvalue()
+
+
+REPORT_MODEL = "gpt-4o-mini"
+# Bump when the report prompt or layout changes so cached PDFs are rebuilt
+REPORT_PROMPT_VERSION = "3"
+
+REPORT_SYSTEM_PROMPT = """
 You are a compassionate, observant, and medically knowledgeable AI assistant working alongside a physician.
 
 Context:
-You will receive a JSON-formatted record of a patient's daily health monitoring answers organized by date. Each date contains the patient's responses to routine health questions for that day.
+You will receive a compact JSON record of a patient's daily health monitoring answers organized by date (its format is described with the data). Each date contains the patient's responses to routine health questions for that day.
+For long monitoring periods, the older history comes first as short summaries, one per week or month, and the JSON covers only the most recent days.
 
 Your goal:
 Generate a concise, medically informative report that summarizes the patient's day-by-day health progression for the physician to review.
@@ -849,7 +1716,7 @@ Produce structured text ready for PDF, using the following sections:
 <1-2 short paragraphs summarizing the overall health trend across all days>
 
 **2. Daily Progression**
-For each date, provide a brief summary:
+For each date in the JSON, provide a brief summary:
 
 **Date: YYYY-MM-DD**
 - Key observations from that day's responses
@@ -857,100 +1724,512 @@ For each date, provide a brief summary:
 - Overall condition assessment
 
 **3. Trends and Patterns**
-<Identify patterns across multiple days>
+<Identify patterns across multiple days, including the summarized earlier history>
 
 **4. Recommendations**
 <2-4 concise points the physician should address or monitor>
 
 Keep it clear, clinical, and organized by date.
 """
-        
-        user_prompt = f"""
+
+
+def report_request(days, summaries=None) -> dict:
+    """
+    Chat completion arguments for the physician report on [(day, timeline document), ...],
+    preceded by summaries [(start, end, summary), ...] of the older periods when given.
+    """
+    user_prompt = f"""
+{summaries_block(summaries)}Patient timeline (JSON):
+{timelines.COMPACT_DAILY_FORMAT}
+{timelines.dumps(timelines.compact_daily(days))}
+"""
+
+    return dict(
+        model=REPORT_MODEL,
+        messages=[
+            {"role": "system", "content": REPORT_SYSTEM_PROMPT.strip()},
+            {"role": "user", "content": user_prompt.strip()}
+        ],
+        max_completion_tokens=8000
+    )
+
+
+async def generate_report_text(days, summaries=None, provider: Optional[LLMProvider] = None) -> str:
+    """
+    Ask the LLM for the physician report text for [(day, timeline document), ...].
+    """
+    completion = await llm_complete("generate_report_text", report_request(days, summaries), provider)
+    return completion.content.strip()
+
+
+class ReportNoData(LookupError):
+    pass
+
+
+# --- Summaries of older history ---
+# Reports and trend follow-ups send the whole range as raw answers when it spans at most
+# REPORT_RAW_MAX_DAYS days of data and fits PROMPT_TOKEN_BUDGET. Otherwise only the last
+# REPORT_RECENT_DAYS days (rounded back to the start of their week/month) go in raw, and
+# everything older as one cached LLM summary per calendar SUMMARY_PERIOD, written once and
+# only redone when that period's answers change.
+REPORT_RAW_MAX_DAYS = int(os.getenv("REPORT_RAW_MAX_DAYS", "90"))
+REPORT_RECENT_DAYS = int(os.getenv("REPORT_RECENT_DAYS", "14"))  # 0 never summarizes
+SUMMARY_PERIOD = os.getenv("SUMMARY_PERIOD", "week")
+if SUMMARY_PERIOD not in timelines.PERIODS:
+    raise ValueError(f"SUMMARY_PERIOD must be one of {timelines.PERIODS}, got {SUMMARY_PERIOD!r}")
+SUMMARY_CONCURRENCY = int(os.getenv("SUMMARY_CONCURRENCY", "4"))
+SUMMARY_MODEL = "gpt-4o-mini"
+# Bump when the summary prompt changes so cached summaries are rewritten
+SUMMARY_PROMPT_VERSION = "2"
+
+SUMMARY_SYSTEM_PROMPT = """
+You are a medically knowledgeable assistant preparing notes for a physician.
+
+You will receive a compact JSON record of a patient's daily health monitoring answers for one period, organized by date.
+Summarize the period in at most 120 words of plain text:
+- The patient's overall condition and how it changed across the period
+- Symptoms that appeared, worsened, improved or resolved, with their dates
+- Anything the physician should follow up on
+
+Only report what the answers say. No diagnosis, no headings, no lists.
+"""
+
+
+def period_summary_request(start_d: date, end_d: date, days) -> dict:
+    """
+    Chat completion arguments for the summary of one period's [(day, timeline document), ...].
+    """
+    user_prompt = f"""
+Period: {start_d.isoformat()} to {end_d.isoformat()}
 Patient timeline (JSON):
-{json_string}
+{timelines.COMPACT_DAILY_FORMAT}
+{timelines.dumps(timelines.compact_daily(days))}
 """
-        
-        resp = client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[
-                {"role": "system", "content": system_prompt.strip()},
-                {"role": "user", "content": user_prompt.strip()}
-            ],
-            max_completion_tokens=8000
-        )
-        
-        report_text = resp.choices[0].message.content.strip()
-        
-        # Build PDF
-        styles = getSampleStyleSheet()
-        body = ParagraphStyle(
-            "Body",
-            parent=styles["BodyText"],
-            leading=14,
-            spaceAfter=8
-        )
-        heading = ParagraphStyle(
-            "Heading",
-            parent=styles["Heading2"],
-            spaceBefore=6,
-            spaceAfter=6
-        )
-        title = ParagraphStyle(
-            "Title",
-            parent=styles["Heading1"],
-            alignment=1,
-            spaceAfter=12
-        )
-        
-        def to_flow(report: str):
-            flow = []
-            chunks = [c.strip() for c in report.split("\n\n") if c.strip()]
-            for block in chunks:
-                if block.startswith("**") and block.endswith("**") and len(block) > 4:
-                    flow.append(Paragraph(block.strip("* "), title))
-                    flow.append(Spacer(1, 0.15 * inch))
-                    continue
-                
-                lines = block.splitlines()
-                if lines and lines[0].startswith("**") and lines[0].endswith("**"):
-                    flow.append(Paragraph(lines[0].strip("* "), heading))
-                    rest = "\n".join(lines[1:]).strip()
-                    if rest:
-                        flow.append(Paragraph(rest.replace("\n", "<br/>"), body))
-                    flow.append(Spacer(1, 0.12 * inch))
-                else:
-                    flow.append(Paragraph(block.replace("\n", "<br/>"), body))
-            return flow
-        
-        doc = SimpleDocTemplate(
-            pdf_path,
-            pagesize=LETTER,
-            leftMargin=0.9 * inch,
-            rightMargin=0.9 * inch,
-            topMargin=0.8 * inch,
-            bottomMargin=0.8 * inch,
-            title="Patient Summary Report",
-            author="Health Assistant AI"
-        )
-        
-        flowables = to_flow(report_text)
-        if not flowables:
-            flowables = [Paragraph("Patient Summary Report", title)]
-        
-        doc.build(flowables)
-        
-        # Return the PDF file for download
-        return FileResponse(
-            path=pdf_path,
-            media_type="application/pdf",
-            filename=pdf_filename,
-            headers={"Content-Disposition": f"attachment; filename={pdf_filename}"}
+
+    return dict(
+        model=SUMMARY_MODEL,
+        messages=[
+            {"role": "system", "content": SUMMARY_SYSTEM_PROMPT.strip()},
+            {"role": "user", "content": user_prompt.strip()}
+        ],
+        max_completion_tokens=600
+    )
+
+
+async def generate_period_summary(start_d: date, end_d: date, days,
+                                  provider: Optional[LLMProvider] = None) -> str:
+    request = period_summary_request(start_d, end_d, days)
+    completion = await llm_complete("generate_period_summary", request, provider)
+    return completion.content.strip()
+
+
+def timeline_stats(db: Session, user_id: int, start_d: date, end_d: date):
+    """
+    (days, sum of revisions, latest update) over the user's daily_timelines rows in the range;
+    changes whenever a day in it is rebuilt, added or removed.
+    """
+    return (
+        db.query(func.count(), func.sum(DailyTimeline.revision), func.max(DailyTimeline.updated_at))
+        .filter(DailyTimeline.user_id == user_id, DailyTimeline.t_date >= start_d, DailyTimeline.t_date <= end_d)
+        .one()
+    )
+
+
+def summary_source_key(days: int, revisions: int, latest) -> str:
+    raw = "|".join(str(v) for v in (SUMMARY_PROMPT_VERSION, SUMMARY_MODEL, days, revisions, latest))
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def plan_period_summaries(db: Session, user_id: int, periods):
+    """
+    [(start, end, source_key, cached summary or None), ...] for the periods that have
+    timeline data. Two queries however many periods: per-day revisions over the whole
+    span (no payloads) and the stored summaries.
+    """
+    first_d, last_d = periods[0][0], periods[-1][1]
+    stats = {}
+    starts = [p[0] for p in periods]
+    rows = db.execute(
+        select(DailyTimeline.t_date, DailyTimeline.revision, DailyTimeline.updated_at)
+        .where(DailyTimeline.user_id == user_id, DailyTimeline.t_date >= first_d, DailyTimeline.t_date <= last_d)
+    )
+    for day, revision, updated_at in rows:
+        period = periods[bisect.bisect_right(starts, day) - 1]
+        days, revisions, latest = stats.get(period, (0, 0, None))
+        stats[period] = (days + 1, revisions + revision, updated_at if latest is None else max(latest, updated_at))
+
+    stored = {
+        (r.start_date, r.end_date): r
+        for r in db.query(PeriodSummary).filter(
+            PeriodSummary.user_id == user_id,
+            PeriodSummary.start_date >= first_d,
+            PeriodSummary.end_date <= last_d,
         )
+    }
+    plan = []
+    for period in periods:
+        if period not in stats:
+            continue
+        key = summary_source_key(*stats[period])
+        row = stored.get(period)
+        plan.append((period[0], period[1], key, row.summary if row is not None and row.source_key == key else None))
+    return plan
+
+
+def store_period_summaries(db: Session, user_id: int, written):
+    """
+    Upsert [(start, end, source_key, summary), ...].
+    """
+    for start_d, end_d, key, summary in written:
+        db.merge(PeriodSummary(user_id=user_id, start_date=start_d, end_date=end_d,
+                               source_key=key, summary=summary, created_at=datetime.utcnow()))
+    try:
+        db.commit()
+    except IntegrityError:
+        # A concurrent report for the same user stored these periods first
+        db.rollback()
+
+
+async def summarize_history(user_id: int, periods, provider: Optional[LLMProvider] = None):
+    """
+    [(start, end, summary), ...] for the given periods that have data, summarizing
+    (concurrently, at most SUMMARY_CONCURRENCY at a time) only the ones whose cached
+    summary is missing or out of date.
+    """
+    plan = await run_db(plan_period_summaries, user_id, periods)
+    missing = [(s, e, key) for s, e, key, summary in plan if summary is None]
+    written = {}
+    if missing:
+        provider = provider or llm_providers.get_provider()
+        if not provider.configured():
+            raise RuntimeError("OPENAI_API_KEY not configured")
+        semaphore = asyncio.Semaphore(SUMMARY_CONCURRENCY)
+
+        async def summarize(start_d: date, end_d: date, key: str):
+            async with semaphore:
+                days = await run_db(load_timeline_days, user_id, start_d, end_d)
+                summary = await generate_period_summary(start_d, end_d, days, provider)
+            written[(start_d, end_d)] = (start_d, end_d, key, summary)
+
+        await asyncio.gather(*(summarize(*m) for m in missing))
+        await run_db(store_period_summaries, user_id, list(written.values()))
+
+    return [
+        (s, e, summary if summary is not None else written[(s, e)][3])
+        for s, e, key, summary in plan
+    ]
+
+
+async def history_inputs(user_id: int, start_d: date, end_d: date, stage: str,
+                         recent_days: Optional[int] = None):
+    """
+    ([(day, timeline document), ...] for the recent days, summaries of the older periods)
+    for a report or trend prompt over [start_d, end_d]. Loading the recent days is timed as `stage`.
+    """
+    recent_days = REPORT_RECENT_DAYS if recent_days is None else recent_days
+    periods, raw_start = timelines.split_for_summary(start_d, end_d, recent_days, SUMMARY_PERIOD)
+    with metrics.timed(stage):
+        days = await run_db(load_timeline_days, user_id, raw_start, end_d)
+    summaries = []
+    if periods:
+        with metrics.timed("history_summaries"):
+            summaries = await summarize_history(user_id, periods)
+    return days, summaries
+
+
+def first_timeline_day(db: Session, user_id: int, start_d: date, end_d: date) -> Optional[date]:
+    return db.scalar(
+        select(func.min(DailyTimeline.t_date))
+        .where(DailyTimeline.user_id == user_id, DailyTimeline.t_date >= start_d, DailyTimeline.t_date <= end_d)
+    )
+
+
+def fit_history(build, days, summaries):
+    """
+    (days, summaries) with the oldest summaries, then the oldest days, dropped until
+    build(days, summaries) fits PROMPT_TOKEN_BUDGET. The latest day is always kept.
+    """
+    keep = token_budget.largest_fitting(lambda n: build(days, summaries[len(summaries) - n:]), len(summaries))
+    summaries = summaries[len(summaries) - keep:]
+    if keep == 0 and days:
+        keep = token_budget.largest_fitting(lambda n: build(days[len(days) - n:], []), len(days), n_min=1)
+        days = days[len(days) - keep:]
+    return days, summaries
+
+
+async def prompt_history(user_id: int, start_d: date, end_d: date, build, stage: str):
+    """
+    (days, summaries) for a prompt build(days, summaries) over [start_d, end_d], within
+    PROMPT_TOKEN_BUDGET; ([], []) if the range has no data.
+
+    The whole range goes raw (no summary calls) when its data spans at most
+    REPORT_RAW_MAX_DAYS and fits. Otherwise older periods are summarized, moving
+    more of the range into summaries while over budget, and what is still over
+    is trimmed by fit_history().
+    """
+    first_d = await run_db(first_timeline_day, user_id, start_d, end_d)
+    if first_d is None:
+        return [], []
+    start_d = first_d  # Summary periods then line up the same way for any earlier start
+    if (end_d - start_d).days < REPORT_RAW_MAX_DAYS or REPORT_RECENT_DAYS <= 0:
+        days, _ = await history_inputs(user_id, start_d, end_d, stage, recent_days=0)
+        if REPORT_RECENT_DAYS <= 0 or token_budget.fits(build(days, [])):
+            return fit_history(build, days, [])
+
+    recent_days = REPORT_RECENT_DAYS
+    while True:
+        days, summaries = await history_inputs(user_id, start_d, end_d, stage, recent_days)
+        if recent_days <= 1 or token_budget.fits(build(days, summaries)):
+            break
+        # Over budget: summarize more of the range (cached) rather than cut it
+        recent_days //= 2
+    return fit_history(build, days, summaries)
+
+
+async def report_inputs(user_id: int, start_d: date, end_d: date):
+    """
+    (days, summaries) for the report prompt. Raises ReportNoData if the range is empty.
+    """
+    days, summaries = await prompt_history(user_id, start_d, end_d, report_request, "report_timeline")
+    if not days and not summaries:
+        raise ReportNoData("No data found in date range")
+    return days, summaries
+
+
+# --- Rendered report cache (set REPORT_CACHE_DIR="" to keep reports in memory only) ---
+REPORT_CACHE_DIR = os.getenv("REPORT_CACHE_DIR", os.path.join(os.getcwd(), "reports"))
+report_store = ReportStore(
+    REPORT_CACHE_DIR,
+    max_bytes=int(float(os.getenv("REPORT_CACHE_MAX_MB", "200")) * 1024 * 1024),
+) if REPORT_CACHE_DIR else None
+
+
+def report_fingerprint(db: Session, user_id: int, start_d: date, end_d: date) -> str:
+    """
+    Cache key for a report: changes whenever a day's timeline in the range is rebuilt, added or removed.
+    """
+    days, revisions, latest = timeline_stats(db, user_id, start_d, end_d)
+    raw = "|".join(str(v) for v in (
+        REPORT_PROMPT_VERSION, REPORT_MODEL, SUMMARY_PROMPT_VERSION, SUMMARY_MODEL,
+        REPORT_RAW_MAX_DAYS, REPORT_RECENT_DAYS, SUMMARY_PERIOD, token_budget.PROMPT_TOKEN_BUDGET, user_id, start_d, end_d,
+        days, revisions, latest,
+    ))
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+async def build_report_pdf(user_id: int, start_d: date, end_d: date):
+    """
+    Aggregate the timeline, run the LLM analysis and render the PDF in memory,
+    or serve the stored copy if nothing in the range changed since it was built.
+    Returns (pdf_bytes, pdf_filename); raises ReportNoData if the range is empty.
+    """
+    pdf_filename = f"patient_report_{user_id}_{end_d.isoformat()}.pdf"
+    key = None
+    if report_store:
+        key = await run_db(report_fingerprint, user_id, start_d, end_d)
+        cached = await run_in_threadpool(report_store.get, key)
+        if cached is not None:
+            return cached, pdf_filename
+
+    days, summaries = await report_inputs(user_id, start_d, end_d)
+
+    if not llm_providers.get_provider().configured():
+        raise RuntimeError("OPENAI_API_KEY not configured")
+    report_text = await generate_report_text(days, summaries)
+
+    pdf_bytes = await render_and_store_report(report_text, key)
+    return pdf_bytes, pdf_filename
+
+
+async def render_and_store_report(report_text: str, key: Optional[str]) -> bytes:
+    # CPU-bound, keep it off the event loop
+    pdf_bytes = await run_in_threadpool(render_report_pdf, report_text)
+    if report_store and key:
+        await run_in_threadpool(report_store.put, key, pdf_bytes)
+    return pdf_bytes
+
+
+def pdf_response(pdf_bytes: bytes, pdf_filename: str) -> StreamingResponse:
+    def chunks(size: int = 64 * 1024):
+        view = memoryview(pdf_bytes)
+        for i in range(0, len(view), size):
+            yield bytes(view[i:i + size])
+
+    return StreamingResponse(
+        chunks(),
+        media_type="application/pdf",
+        headers={
+            "Content-Disposition": f"attachment; filename={pdf_filename}",
+            "Content-Length": str(len(pdf_bytes)),
+        },
+    )
+
+
+async def run_report_job(job: ReportJob):
+    start_d, end_d = parse_report_range(job.params)
+    return await build_report_pdf(job.params.user_id, start_d, end_d)
+
+
+REPORT_WORKERS = int(os.getenv("REPORT_WORKERS", "2"))
+REPORT_QUEUE_SIZE = int(os.getenv("REPORT_QUEUE_SIZE", "20"))
+REPORT_JOBS_RETAINED = int(os.getenv("REPORT_JOBS_RETAINED", "50"))  # finished jobs kept for polling
+report_jobs = ReportJobQueue(run_report_job, workers=REPORT_WORKERS, max_queued=REPORT_QUEUE_SIZE,
+                             max_finished=REPORT_JOBS_RETAINED)
+
+
+@app.on_event("startup")
+async def startup_report_jobs():
+    report_jobs.start()
+
+
+@app.on_event("shutdown")
+async def shutdown_report_jobs():
+    await report_jobs.stop()
+
+
+@app.post("/generate_report_pdf")
+async def generate_report_pdf(payload: GenerateReportRequest):
+    """
+    Generate PDF report from database and return file for download.
+    Runs through the report job queue, so concurrent builds stay capped.
+    """
+    try:
+        job = report_jobs.submit(payload)
+    except QueueFull:
+        raise HTTPException(status_code=503, detail="Report queue is full, try again later")
+
+    try:
+        await job.wait()
+    finally:
+        # Nobody polls this job; don't keep its PDF around for JOB_RETENTION
+        report_jobs.discard(job.id)
+    if job.status == "failed":
+        if isinstance(job.error, ReportNoData):
+            raise HTTPException(status_code=404, detail=str(job.error))
+        raise HTTPException(status_code=500, detail=str(job.error))
+
+    # Return the PDF for download
+    return pdf_response(*job.result)
+
+
+# --- Asynchronous report jobs ---
+def job_status(job: ReportJob) -> dict:
+    status = {
+        "job_id": job.id,
+        "status": job.status,
+        "created_at": job.created_at.isoformat() + "Z",
+        "finished_at": job.finished_at.isoformat() + "Z" if job.finished_at else None,
+    }
+    if job.status == "failed":
+        status["error"] = str(job.error)
+    return status
+
+
+@app.post("/reports/jobs", status_code=202)
+async def submit_report_job(payload: GenerateReportRequest):
+    try:
+        parse_report_range(payload)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid date format. Use YYYY-MM-DD")
+    try:
+        job = report_jobs.submit(payload)
+    except QueueFull:
+        raise HTTPException(status_code=503, detail="Report queue is full, try again later")
+    return job_status(job)
+
+
+@app.get("/reports/jobs/{job_id}")
+async def get_report_job(job_id: str):
+    job = report_jobs.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job_status(job)
+
+
+@app.get("/reports/jobs/{job_id}/download")
+async def download_report_job(job_id: str):
+    job = report_jobs.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    if job.status != "done":
+        raise HTTPException(status_code=409, detail=f"Job is {job.status}")
+
+    # Return the PDF for download
+    return pdf_response(*job.result)
+
+
+# --- Token streaming ---
+@app.post("/generate_report_preview/stream")
+async def stream_report_preview(payload: GenerateReportRequest):
+    """
+    Stream the report text to the physician UI as the LLM writes it.
+
+    Once the stream completes the PDF is rendered from the same text and put
+    in the report cache (when there is one), so a following /generate_report_pdf
+    for the same range is served without another LLM call. The build takes a
+    report_jobs slot, so previews and queued reports share one concurrency cap.
+    """
+    try:
+        start_d, end_d = parse_report_range(payload)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid date format. Use YYYY-MM-DD")
+    user_id = payload.user_id
+
+    if not llm_providers.get_provider().configured():
+        raise HTTPException(status_code=500, detail="OPENAI_API_KEY not configured")
+    # Fingerprint before loading, as build_report_pdf does: a change that lands in
+    # between then gives a newer key than this text, never an older one
+    key = await run_db(report_fingerprint, user_id, start_d, end_d) if report_store else None
+    try:
+        async with report_jobs.slot():
+            days, summaries = await report_inputs(user_id, start_d, end_d)
+    except ReportNoData as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
+    async def tokens():
+        async with report_jobs.slot():
+            parts = []
+            async for delta in stream_completion(report_request(days, summaries), "generate_report_preview"):
+                parts.append(delta)
+                yield delta
+            if key:
+                # The text is already delivered; the PDF is only worth rendering to cache it
+                await render_and_store_report("".join(parts).strip(), key)
+
+    return StreamingResponse(tokens(), media_type="text/plain; charset=utf-8")
+
+
+@app.post("/generate_trend_followups/stream")
+async def stream_trend_followups(data: TrendRequest):
+    """
+    Stream the follow-up questions as they are generated. The concatenated
+    body is the same JSON dict /generate_trend_followups returns under
+    "trend_followup_questions".
+    """
+    if not llm_providers.get_provider().configured():
+        raise HTTPException(status_code=500, detail="OPENAI_API_KEY not configured")
+    try:
+        request = trend_followup_request(*await trend_inputs(data))
+        chunks = stream_completion(request, "generate_trend_followups_stream")
+        # Wait for the first token here so a failing LLM call is still a 500 with detail;
+        # once the body has started a failure can only end the stream
+        try:
+            first = await chunks.__anext__()
+        except StopAsyncIteration:
+            first = None
     except HTTPException:
         raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+    async def body():
+        if first is not None:
+            yield first
+        async for delta in chunks:
+            yield delta
+
+    return StreamingResponse(body(), media_type="text/plain; charset=utf-8")
+
 
 if __name__ == "__main__":
     import uvicorn
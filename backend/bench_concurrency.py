@@ -0,0 +1,70 @@
+"""
+Concurrency check for the chat endpoints.
+
+Fires N parallel /chat/next-question calls (one per fresh user, so every call
+has to generate its daily questions) against a local stub LLM with a fixed
+latency, and checks that the total wall time stays close to a single call's
+latency. If the event loop were blocked the calls would run one after another
+(~N x latency); what remains above one latency is SQLite commit time.
+
+Usage:
+    python bench_concurrency.py [--requests 50] [--latency 1.0] [--tolerance 3.0]
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+# Point the app at a throwaway database before it is imported
+_tmpdir = tempfile.mkdtemp(prefix="lulu_bench_")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_tmpdir, 'bench.db')}"
+
+import httpx
+
+import llm_providers
+from app import app, init_db
+
+
+async def run(n_requests: int, latency: float):
+    llm_providers.set_provider(llm_providers.StubProvider(latency=latency))
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as http:
+        async def one(user_id: int):
+            t0 = time.perf_counter()
+            r = await http.post("/chat/next-question", json={"user_id": user_id})
+            r.raise_for_status()
+            return time.perf_counter() - t0
+
+        started = time.perf_counter()
+        latencies = await asyncio.gather(*(one(1000 + i) for i in range(n_requests)))
+        wall = time.perf_counter() - started
+    await llm_providers.close_provider()
+    return wall, latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=50)
+    parser.add_argument("--latency", type=float, default=1.0, help="stub LLM latency in seconds")
+    parser.add_argument("--tolerance", type=float, default=3.0,
+                        help="max allowed wall time as a multiple of the stub latency")
+    args = parser.parse_args()
+
+    init_db()
+    wall, latencies = asyncio.run(run(args.requests, args.latency))
+    print(f"{args.requests} parallel /chat/next-question calls")
+    print(f"  stub LLM latency: {args.latency:.2f}s")
+    print(f"  wall time:        {wall:.2f}s")
+    print(f"  slowest call:     {max(latencies):.2f}s")
+
+    budget = args.latency * args.tolerance
+    if wall > budget:
+        print(f"❌ wall time exceeds {budget:.2f}s — requests are being serialized")
+        sys.exit(1)
+    print(f"✅ within {budget:.2f}s budget")
+
+
+if __name__ == "__main__":
+    main()
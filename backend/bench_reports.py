@@ -0,0 +1,191 @@
+"""
+Benchmark for report assembly (the DB side of /generate_report_json and
+/generate_report_pdf).
+
+Seeds a throwaway SQLite database with N days of questions and answers for one
+user, then compares three ways of assembling the report data, reporting SQL
+statement count and latency for each:
+
+    legacy    one answer query per question
+    join      one eager-loaded questions/answers join over the range
+    timeline  one range scan of the materialized daily_timelines table (current)
+
+The report range defaults to the whole seeded history; --range-days narrows it
+to show that the timeline variant scales with the range, not the history.
+
+Usage:
+    python bench_reports.py [--days 180] [--questions 8] [--range-days 0] [--repeat 5]
+"""
+import argparse
+import os
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+# Point the app at a throwaway database before it is imported
+_tmpdir = tempfile.mkdtemp(prefix="lulu_bench_")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_tmpdir, 'bench.db')}"
+
+from sqlalchemy import and_, event
+from sqlalchemy.orm import contains_eager
+
+from app import (
+    SessionLocal, engine, Question, Answer, today, init_db,
+    build_answer_timeline, build_daily_timeline, refresh_timelines,
+)
+
+USER_ID = 1
+
+
+def seed(days: int, questions_per_day: int):
+    db = SessionLocal()
+    try:
+        for day in range(days):
+            d = today() - timedelta(days=day)
+            base = datetime.combine(d, datetime.min.time()) + timedelta(hours=9)
+            qs = [
+                Question(user_id=USER_ID, text=f"Daily question {i + 1}", q_date=d,
+                         order_index=i, source="daily", asked_at=base, created_at=base)
+                for i in range(questions_per_day)
+            ]
+            db.add_all(qs)
+            db.flush()
+            db.add_all([
+                Answer(user_id=USER_ID, question_id=q.id, text=f"Answer {q.order_index + 1} on {d}",
+                       created_at=base + timedelta(minutes=q.order_index))
+                for q in qs
+            ])
+        refresh_timelines(db, [USER_ID], today() - timedelta(days=days - 1), today())
+        db.commit()
+    finally:
+        db.close()
+
+
+# --- Previous implementation: one answer query per question ---
+def _legacy_questions(db, user_id, start_d, end_d):
+    return (
+        db.query(Question)
+        .filter(Question.user_id == user_id, Question.q_date >= start_d, Question.q_date <= end_d)
+        .order_by(Question.q_date.asc(), Question.order_index.asc())
+        .all()
+    )
+
+
+def _legacy_answers(db, q, user_id):
+    return (
+        db.query(Answer)
+        .filter(Answer.question_id == q.id, Answer.user_id == user_id)
+        .order_by(Answer.created_at.asc())
+        .all()
+    )
+
+
+def legacy_answer_timeline(db, user_id, start_d, end_d):
+    result = {}
+    for q in _legacy_questions(db, user_id, start_d, end_d):
+        result.setdefault(q.text, {})
+        for idx, ans in enumerate(_legacy_answers(db, q, user_id), start=1):
+            result[q.text][f"A{idx}"] = f"{ans.created_at.strftime('%Y-%m-%d %H:%M:%S')}, {ans.text}"
+    return result
+
+
+def legacy_daily_timeline(db, user_id, start_d, end_d):
+    json_data = {}
+    for q in _legacy_questions(db, user_id, start_d, end_d):
+        day = json_data.setdefault(q.q_date.isoformat(), {})
+        answers = _legacy_answers(db, q, user_id)
+        if answers:
+            day[q.text] = answers[0].text
+    return json_data
+
+
+# --- Previous implementation: one outer join with eager-loaded answers ---
+def _joined_questions(db, user_id, start_d, end_d):
+    return (
+        db.query(Question)
+        .outerjoin(Answer, and_(Answer.question_id == Question.id, Answer.user_id == user_id))
+        .options(contains_eager(Question.answers))
+        .filter(Question.user_id == user_id, Question.q_date >= start_d, Question.q_date <= end_d)
+        .order_by(Question.q_date.asc(), Question.order_index.asc(), Answer.created_at.asc())
+        .all()
+    )
+
+
+def join_answer_timeline(db, user_id, start_d, end_d):
+    result = {}
+    for q in _joined_questions(db, user_id, start_d, end_d):
+        result.setdefault(q.text, {})
+        for idx, ans in enumerate(q.answers, start=1):
+            result[q.text][f"A{idx}"] = f"{ans.created_at.strftime('%Y-%m-%d %H:%M:%S')}, {ans.text}"
+    return result
+
+
+def join_daily_timeline(db, user_id, start_d, end_d):
+    json_data = {}
+    for q in _joined_questions(db, user_id, start_d, end_d):
+        day = json_data.setdefault(q.q_date.isoformat(), {})
+        if q.answers:
+            day[q.text] = q.answers[0].text
+    return json_data
+
+
+class QueryCounter:
+    def __init__(self):
+        self.count = 0
+        event.listen(engine, "before_cursor_execute", self._on_execute)
+
+    def _on_execute(self, *args):
+        self.count += 1
+
+
+def measure(fn, counter: QueryCounter, repeat: int, range_days: int):
+    end_d = today()
+    start_d = end_d - timedelta(days=range_days - 1 if range_days else 10_000)
+    timings = []
+    result = None
+    for _ in range(repeat):
+        db = SessionLocal()
+        try:
+            counter.count = 0
+            t0 = time.perf_counter()
+            result = fn(db, USER_ID, start_d, end_d)
+            timings.append(time.perf_counter() - t0)
+        finally:
+            db.close()
+    timings.sort()
+    return counter.count, timings[len(timings) // 2], result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--days", type=int, default=180)
+    parser.add_argument("--questions", type=int, default=8, help="questions per day")
+    parser.add_argument("--range-days", type=int, default=0, help="report range in days (0 = all history)")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+    init_db()
+
+    print(f"Seeding {args.days} days x {args.questions} questions...")
+    seed(args.days, args.questions)
+    counter = QueryCounter()
+
+    cases = [
+        ("generate_report_json", [
+            ("legacy", legacy_answer_timeline), ("join", join_answer_timeline), ("timeline", build_answer_timeline),
+        ]),
+        ("generate_report_pdf", [
+            ("legacy", legacy_daily_timeline), ("join", join_daily_timeline), ("timeline", build_daily_timeline),
+        ]),
+    ]
+    print(f"\n{'report':<22}{'variant':<10}{'queries':>10}{'median ms':>12}")
+    for name, variants in cases:
+        expected = None
+        for variant, fn in variants:
+            queries, median, result = measure(fn, counter, args.repeat, args.range_days)
+            expected = result if expected is None else expected
+            assert result == expected, f"{name}: {variant} result differs"
+            print(f"{name:<22}{variant:<10}{queries:>10}{median * 1000:>12.1f}")
+
+
+if __name__ == "__main__":
+    main()
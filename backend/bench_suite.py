@@ -0,0 +1,235 @@
+"""
+Benchmark suite for the chat, report and generation hot paths.
+
+Seeds a fresh SQLite file with bulk_seed() (users x days x questions per day),
+runs the app in-process over httpx's ASGI transport with the stub LLM
+provider, and measures each endpoint with a fixed number of requests at a
+fixed concurrency:
+
+    next_question   POST /chat/next-question
+    answer          POST /chat/answer
+    messages        GET  /chat/messages (one day)
+    messages_range  GET  /chat/messages (whole seeded range)
+    report_json     POST /generate_report_json
+    report_pdf      POST /generate_report_pdf (report cache off, so every call renders)
+
+Results (throughput, p50/p95/p99/max latency, errors) are written as JSON.
+Pass --baseline with an earlier result file to print the p95/throughput
+change per scenario.
+
+Usage:
+    python bench_suite.py [--users 50] [--days 30] [--questions 6] [--requests 200]
+                          [--concurrency 10] [--llm-latency-ms 0] [--only answer,messages]
+                          [--output bench_results.json] [--baseline old.json]
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+# Fresh database, offline LLM and no report disk cache before the app is imported
+_tmpdir = tempfile.mkdtemp(prefix="lulu_suite_")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_tmpdir, 'suite.db')}"
+os.environ["LLM_PROVIDER"] = "stub"
+os.environ["REPORT_CACHE_DIR"] = ""
+
+import httpx
+
+import llm_providers
+from app import app, SessionLocal, Question, bulk_seed, init_db, today
+
+SCENARIOS = ("next_question", "answer", "messages", "messages_range", "report_json", "report_pdf")
+
+
+def seed(users: int, days: int, questions: int, answer_rate: float, seed_value: int):
+    db = SessionLocal()
+    try:
+        started = time.perf_counter()
+        counts = bulk_seed(db, list(range(1, users + 1)), today(), days,
+                           questions_per_day=questions, answer_rate=answer_rate, seed=seed_value)
+        counts["seconds"] = round(time.perf_counter() - started, 3)
+        todays = db.query(Question.id, Question.user_id).filter(Question.q_date == today()).all()
+    finally:
+        db.close()
+    return counts, todays
+
+
+def make_requests(args, todays):
+    """
+    Request factories per scenario: fn(rng) -> (method, url, kwargs).
+    """
+    end_d = today()
+    start_d = end_d - timedelta(days=args.days - 1)
+    report_days = min(args.days, args.report_days)
+    report_body = lambda rng: {
+        "user_id": rng.randint(1, args.users),
+        "start_date": (end_d - timedelta(days=report_days - 1)).isoformat(),
+        "end_date": end_d.isoformat(),
+    }
+
+    def answer(rng):
+        q_id, user_id = rng.choice(todays)
+        return "POST", "/chat/answer", {"json": {"user_id": user_id, "question_id": q_id, "answer_text": "Fine today"}}
+
+    return {
+        "next_question": lambda rng: ("POST", "/chat/next-question", {"json": {"user_id": rng.randint(1, args.users)}}),
+        "answer": answer,
+        "messages": lambda rng: ("GET", "/chat/messages", {"params": {"user_id": rng.randint(1, args.users)}}),
+        "messages_range": lambda rng: ("GET", "/chat/messages", {"params": {
+            "user_id": rng.randint(1, args.users),
+            "start_date": start_d.isoformat(),
+            "end_date": end_d.isoformat(),
+        }}),
+        "report_json": lambda rng: ("POST", "/generate_report_json", {"json": report_body(rng)}),
+        "report_pdf": lambda rng: ("POST", "/generate_report_pdf", {"json": report_body(rng)}),
+    }
+
+
+def percentile(sorted_values, p: float) -> float:
+    if not sorted_values:
+        return 0.0
+    rank = max(0, min(len(sorted_values) - 1, int(round(p / 100 * len(sorted_values))) - 1))
+    return sorted_values[rank]
+
+
+def summarize(latencies, errors: int, wall: float) -> dict:
+    ms = sorted(x * 1000 for x in latencies)
+    return {
+        "requests": len(latencies) + errors,
+        "errors": errors,
+        "wall_s": round(wall, 3),
+        "throughput_rps": round(len(latencies) / wall, 1) if wall else 0.0,
+        "p50_ms": round(percentile(ms, 50), 2),
+        "p95_ms": round(percentile(ms, 95), 2),
+        "p99_ms": round(percentile(ms, 99), 2),
+        "max_ms": round(ms[-1], 2) if ms else 0.0,
+    }
+
+
+async def run_scenario(http: httpx.AsyncClient, factory, n: int, concurrency: int, seed_value: int) -> dict:
+    rng = random.Random(seed_value)
+    planned = [factory(rng) for _ in range(n)]
+    latencies, errors = [], 0
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(method, url, kwargs):
+        nonlocal errors
+        async with semaphore:
+            t0 = time.perf_counter()
+            r = await http.request(method, url, **kwargs)
+            elapsed = time.perf_counter() - t0
+        if r.status_code >= 400:
+            errors += 1
+        else:
+            latencies.append(elapsed)
+
+    # Warm up connections/caches outside the measurement
+    await one(*planned[0])
+    latencies, errors = [], 0
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(*req) for req in planned))
+    return summarize(latencies, errors, time.perf_counter() - started)
+
+
+async def run_suite(args, todays) -> dict:
+    llm_providers.set_provider(llm_providers.StubProvider(latency=args.llm_latency_ms / 1000, seed=args.seed))
+    factories = make_requests(args, todays)
+    scenarios = args.only.split(",") if args.only else SCENARIOS
+    results = {}
+
+    # ASGITransport does not send lifespan events; run the startup/shutdown hooks (report workers) here
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as http:
+            for name in scenarios:
+                n = args.report_requests if name.startswith("report_") else args.requests
+                results[name] = await run_scenario(http, factories[name], n, args.concurrency, args.seed)
+                r = results[name]
+                print(f"{name:<16}{r['throughput_rps']:>10.1f}{r['p50_ms']:>10.1f}{r['p95_ms']:>10.1f}"
+                      f"{r['p99_ms']:>10.1f}{r['errors']:>8}")
+    return results
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except OSError:
+        return ""
+
+
+def compare(results: dict, baseline_path: str):
+    with open(baseline_path) as f:
+        baseline = json.load(f)["results"]
+    print(f"\nvs {baseline_path}")
+    print(f"{'scenario':<16}{'p95 ms':>16}{'req/s':>20}")
+    for name, r in results.items():
+        b = baseline.get(name)
+        if not b:
+            continue
+        dp95 = (r["p95_ms"] - b["p95_ms"]) / b["p95_ms"] * 100 if b["p95_ms"] else 0.0
+        drps = (r["throughput_rps"] - b["throughput_rps"]) / b["throughput_rps"] * 100 if b["throughput_rps"] else 0.0
+        print(f"{name:<16}{b['p95_ms']:>7.1f}->{r['p95_ms']:<7.1f}{dp95:+.0f}%"
+              f"{b['throughput_rps']:>9.1f}->{r['throughput_rps']:<7.1f}{drps:+.0f}%")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--days", type=int, default=30)
+    parser.add_argument("--questions", type=int, default=6, help="questions per day")
+    parser.add_argument("--answer-rate", type=float, default=0.8, help="fraction of seeded questions answered")
+    parser.add_argument("--requests", type=int, default=200, help="requests per chat scenario")
+    parser.add_argument("--report-requests", type=int, default=40, help="requests per report scenario")
+    parser.add_argument("--report-days", type=int, default=30, help="days covered by each report")
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--llm-latency-ms", type=float, default=0.0, help="stub LLM latency")
+    parser.add_argument("--only", help=f"comma-separated subset of: {', '.join(SCENARIOS)}")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default="bench_results.json")
+    parser.add_argument("--baseline", help="earlier result file to compare against")
+    args = parser.parse_args()
+
+    unknown = set(args.only.split(",")) - set(SCENARIOS) if args.only else set()
+    if unknown:
+        parser.error(f"unknown scenario(s): {', '.join(sorted(unknown))}")
+
+    init_db()
+    counts, todays = seed(args.users, args.days, args.questions, args.answer_rate, args.seed)
+    print(f"Seeded {args.users} users x {args.days} days x {args.questions} questions "
+          f"({counts['questions']} questions, {counts['messages']} messages) in {counts['seconds']}s\n")
+    print(f"{'scenario':<16}{'req/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'errors':>8}")
+
+    results = asyncio.run(run_suite(args, todays))
+
+    report = {
+        "meta": {
+            "commit": git_commit(),
+            "timestamp": datetime.utcnow().isoformat() + "Z",
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "config": vars(args),
+            "seeded": counts,
+        },
+        "results": results,
+    }
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nWrote {args.output}")
+
+    if args.baseline:
+        compare(results, args.baseline)
+    if any(r["errors"] for r in results.values()):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+"""
+Write-heavy benchmark: /chat/answer style commits with concurrent readers.
+
+Runs the same workload against two fresh SQLite files, one with SQLite's
+default settings and one with the tuned pragma profile from database.py, and
+reports answers/sec and reader latency for each.
+
+Each writer thread repeatedly inserts an Answer plus its ChatMessage and
+commits (what submit_answer does); reader threads meanwhile poll the day's
+messages like /chat/messages.
+
+Usage:
+    python bench_writes.py [--writers 8] [--readers 4] [--answers 200]
+"""
+import argparse
+import os
+import tempfile
+import threading
+import time
+
+# Keep the app's own engine away from the benchmark files
+_tmpdir = tempfile.mkdtemp(prefix="lulu_bench_")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_tmpdir, 'app.db')}"
+
+from sqlalchemy.orm import sessionmaker
+
+from app import Base, Question, Answer, ChatMessage, today
+from database import make_engine, sqlite_pragmas_from_env
+from migrations import run_migrations
+
+
+def setup(profile: str, questions: int):
+    url = f"sqlite:///{os.path.join(_tmpdir, f'{profile}.db')}"
+    pragmas = sqlite_pragmas_from_env() if profile == "tuned" else None
+    engine = make_engine(url, sqlite_pragmas=pragmas, pool_size=32, max_overflow=0)
+    run_migrations(engine, Base.metadata)
+    Session = sessionmaker(bind=engine)
+    db = Session()
+    qs = [Question(user_id=1, text=f"Q{i}", q_date=today(), order_index=i, source="daily") for i in range(questions)]
+    db.add_all(qs)
+    db.commit()
+    q_ids = [q.id for q in qs]
+    db.close()
+    return engine, Session, q_ids
+
+
+def run_profile(profile: str, writers: int, readers: int, answers_per_writer: int):
+    engine, Session, q_ids = setup(profile, writers * answers_per_writer)
+    stop = threading.Event()
+    read_latencies = []
+    written = []
+    errors = []
+
+    def writer(w: int):
+        db = Session()
+        try:
+            for i in range(answers_per_writer):
+                q_id = q_ids[w * answers_per_writer + i]
+                db.add(Answer(user_id=1, question_id=q_id, text="fine"))
+                db.add(ChatMessage(user_id=1, role="user", content="fine", question_id=q_id, m_date=today()))
+                db.commit()
+                written.append(q_id)
+        except Exception as e:
+            errors.append(e)
+            db.rollback()
+        finally:
+            db.close()
+
+    def reader():
+        db = Session()
+        try:
+            while not stop.is_set():
+                t0 = time.perf_counter()
+                (
+                    db.query(ChatMessage)
+                    .filter(ChatMessage.user_id == 1, ChatMessage.m_date == today())
+                    .order_by(ChatMessage.created_at.asc())
+                    .all()
+                )
+                db.rollback()
+                read_latencies.append(time.perf_counter() - t0)
+        except Exception as e:
+            errors.append(e)
+        finally:
+            db.close()
+
+    reader_threads = [threading.Thread(target=reader) for _ in range(readers)]
+    writer_threads = [threading.Thread(target=writer, args=(w,)) for w in range(writers)]
+    for t in reader_threads:
+        t.start()
+    started = time.perf_counter()
+    for t in writer_threads:
+        t.start()
+    for t in writer_threads:
+        t.join()
+    elapsed = time.perf_counter() - started
+    stop.set()
+    for t in reader_threads:
+        t.join()
+    engine.dispose()
+
+    read_latencies.sort()
+    p95 = read_latencies[int(len(read_latencies) * 0.95)] if read_latencies else 0.0
+    return {
+        "answers_per_sec": len(written) / elapsed,
+        "elapsed": elapsed,
+        "reads": len(read_latencies),
+        "read_p95_ms": p95 * 1000,
+        "errors": len(errors),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--writers", type=int, default=8)
+    parser.add_argument("--readers", type=int, default=4)
+    parser.add_argument("--answers", type=int, default=200, help="answers per writer")
+    args = parser.parse_args()
+
+    print(f"{args.writers} writers x {args.answers} answers, {args.readers} readers\n")
+    print(f"{'profile':<10}{'answers/s':>12}{'reads':>10}{'read p95 ms':>14}{'errors':>8}")
+    for profile in ("default", "tuned"):
+        r = run_profile(profile, args.writers, args.readers, args.answers)
+        print(f"{profile:<10}{r['answers_per_sec']:>12.1f}{r['reads']:>10}{r['read_p95_ms']:>14.1f}{r['errors']:>8}")
+
+
+if __name__ == "__main__":
+    main()
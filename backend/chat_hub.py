@@ -0,0 +1,38 @@
+"""
+In-process fan-out of chat events to connected WebSocket clients.
+
+Every committed ChatMessage is published to the user's subscribers, whichever
+endpoint wrote it. Subscribers live in this process only; a client on another
+worker (or one that fell behind) resyncs with /chat/messages?after_id=...
+"""
+import asyncio
+from collections import defaultdict
+from typing import Dict, Set
+
+SUBSCRIBER_QUEUE_SIZE = 100
+
+
+class ChatHub:
+    def __init__(self):
+        self._subscribers: Dict[int, Set[asyncio.Queue]] = defaultdict(set)
+
+    def subscribe(self, user_id: int) -> asyncio.Queue:
+        queue = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        self._subscribers[user_id].add(queue)
+        return queue
+
+    def unsubscribe(self, user_id: int, queue: asyncio.Queue):
+        subscribers = self._subscribers.get(user_id)
+        if subscribers is None:
+            return
+        subscribers.discard(queue)
+        if not subscribers:
+            del self._subscribers[user_id]
+
+    def publish(self, user_id: int, event: dict):
+        for queue in self._subscribers.get(user_id, ()):
+            try:
+                queue.put_nowait(event)
+            except asyncio.QueueFull:
+                # Slow client: it misses this push and catches up via after_id
+                pass
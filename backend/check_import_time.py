@@ -0,0 +1,80 @@
+"""
+Import-time budget check for the API module.
+
+Imports app in fresh interpreters and fails if:
+  - the median import time is over the budget,
+  - a module that should load on first use (OpenAI SDK, ReportLab, tiktoken) was imported,
+  - importing touched the database (schema creation belongs to init_db())
+    or created the report cache directory.
+
+Usage:
+    python check_import_time.py [--budget-ms 1500] [--runs 5]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+LAZY_MODULES = ("openai", "reportlab", "tiktoken")
+
+PROBE = """
+import json, sys, time
+t0 = time.perf_counter()
+import app
+elapsed = time.perf_counter() - t0
+print(json.dumps({"ms": elapsed * 1000, "loaded": [m for m in %r if m in sys.modules]}))
+""" % (LAZY_MODULES,)
+
+
+def probe(db_path: str, cache_dir: str) -> dict:
+    env = {**os.environ, "DATABASE_URL": f"sqlite:///{db_path}", "REPORT_CACHE_DIR": cache_dir}
+    out = subprocess.run(
+        [sys.executable, "-c", PROBE],
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+        env=env, capture_output=True, text=True, check=True,
+    ).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--budget-ms", type=float, default=float(os.getenv("IMPORT_BUDGET_MS", "1500")))
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    tmpdir = tempfile.mkdtemp(prefix="lulu_import_")
+    db_path = os.path.join(tmpdir, "import.db")
+    cache_dir = os.path.join(tmpdir, "reports")
+    results = [probe(db_path, cache_dir) for _ in range(args.runs)]
+    timings = [r["ms"] for r in results]
+    median = statistics.median(timings)
+
+    failed = False
+    print(f"import app: median {median:.0f} ms, min {min(timings):.0f} ms over {args.runs} runs "
+          f"(budget {args.budget_ms:.0f} ms)")
+    if median > args.budget_ms:
+        print(f"❌ over budget by {median - args.budget_ms:.0f} ms")
+        failed = True
+
+    loaded = sorted({m for r in results for m in r["loaded"]})
+    if loaded:
+        print(f"❌ loaded at import time: {', '.join(loaded)} — import inside the function that needs it")
+        failed = True
+
+    if os.path.exists(db_path):
+        print("❌ importing app touched the database — schema setup belongs in init_db()")
+        failed = True
+    if os.path.exists(cache_dir):
+        print("❌ importing app created the report cache directory — create it on first use")
+        failed = True
+
+    if failed:
+        sys.exit(1)
+    print("✅ within budget, heavy modules deferred, no database or filesystem work at import")
+
+
+if __name__ == "__main__":
+    main()
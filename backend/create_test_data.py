@@ -1,20 +1,23 @@
-from app import SessionLocal, Question, Answer, ChatMessage, today, generate_daily_questions
+from app import (
+    SessionLocal, Question, Answer, ChatMessage, today, generate_daily_questions,
+    SAMPLE_ANSWERS, bulk_seed, init_db, refresh_timelines,
+)
 from datetime import datetime, timedelta
+import asyncio
 import random
 
-# Sample answers for different question types
-SAMPLE_ANSWERS = [
-    "I feel good today, no major issues",
-    "Slight discomfort in the morning, but improved throughout the day",
-    "Energy level is about 7/10",
-    "Sleep was restful, about 8 hours",
-    "Appetite is normal, eating regularly",
-    "No new symptoms observed",
-    "Pain level is around 3/10",
-    "Feeling better than yesterday",
-    "Some fatigue in the afternoon",
-    "Overall condition is stable",
-]
+def create_offline_test_data(user_id: int, days: int):
+    """
+    Seed the last `days` days for user_id from the offline question bank (no GPT calls).
+    """
+    db = SessionLocal()
+    try:
+        counts = bulk_seed(db, [user_id], today(), days, seed=user_id)
+        print(f"\n✅ Created {counts['questions']} questions, {counts['answers']} answers, "
+              f"{counts['messages']} chat messages ({counts['skipped_days']} days already had data)")
+    finally:
+        db.close()
+
 
 def create_test_data_for_date(user_id: int, days_ago: int = 1):
     """
@@ -39,7 +42,7 @@ def create_test_data_for_date(user_id: int, days_ago: int = 1):
         
         # Generate questions using GPT
         print("Generating questions via GPT...")
-        questions_dict = generate_daily_questions("General health monitoring for testing")
+        questions_dict = asyncio.run(generate_daily_questions("General health monitoring for testing"))
         
         # Sort questions by key (Q1, Q2, etc.)
         sorted_keys = sorted(questions_dict.keys(), key=lambda k: int(k[1:]))
@@ -101,6 +104,7 @@ def create_test_data_for_date(user_id: int, days_ago: int = 1):
             
             print(f"  A{idx+1}: {answer_text}")
         
+        refresh_timelines(db, [user_id], target_date)
         db.commit()
         print(f"\n✅ Successfully created test data for {target_date}!")
         print(f"   - {len(question_ids)} questions")
@@ -120,14 +124,22 @@ if __name__ == "__main__":
     
     user_id = 1
     
+    # --offline N: seed the last N days without GPT (see seed_bulk.py for many users)
+    offline = "--offline" in sys.argv
+    args = [a for a in sys.argv[1:] if a != "--offline"]
+
     # Get days_ago from command line or default to 1 (yesterday)
-    days_ago = int(sys.argv[1]) if len(sys.argv) > 1 else 1
+    days_ago = int(args[0]) if args else 1
     
     print("="*60)
     print("Creating Test Data for Patient Health Monitoring")
     print("="*60)
     
-    create_test_data_for_date(user_id, days_ago)
+    init_db()
+    if offline:
+        create_offline_test_data(user_id, days_ago)
+    else:
+        create_test_data_for_date(user_id, days_ago)
     
     print("\n" + "="*60)
     print("Done! You can now test PDF generation with this data.")
@@ -0,0 +1,106 @@
+"""
+Engine factories (sync and async).
+
+SQLite connections get a production pragma profile applied on connect:
+WAL journaling (readers no longer block behind a writer), synchronous=NORMAL,
+a busy timeout instead of immediate "database is locked" errors, and larger
+mmap/page caches. Other databases (e.g. Postgres) get a configurable pool.
+
+Environment variables:
+    SQLITE_TUNING           "off" to keep SQLite defaults (default on)
+    SQLITE_JOURNAL_MODE     default WAL
+    SQLITE_SYNCHRONOUS      default NORMAL
+    SQLITE_BUSY_TIMEOUT_MS  default 5000
+    SQLITE_MMAP_SIZE        bytes, default 268435456 (256 MiB)
+    SQLITE_CACHE_SIZE       pages, or negative KiB; default -65536 (64 MiB)
+    DB_POOL_SIZE            default 10
+    DB_MAX_OVERFLOW         default 20
+    DB_POOL_TIMEOUT         seconds, default 30
+    DB_POOL_RECYCLE         seconds, default 1800
+
+The async engine uses aiosqlite for SQLite and asyncpg for Postgres; the
+driver is derived from the same DATABASE_URL.
+"""
+import os
+from typing import Optional
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
+
+ASYNC_DRIVERS = {
+    "sqlite": "sqlite+aiosqlite",
+    "postgresql": "postgresql+asyncpg",
+    "postgres": "postgresql+asyncpg",
+}
+
+
+def sqlite_pragmas_from_env() -> Optional[dict]:
+    if os.getenv("SQLITE_TUNING", "on").lower() in ("0", "off", "false", "no"):
+        return None
+    return {
+        "journal_mode": os.getenv("SQLITE_JOURNAL_MODE", "WAL"),
+        "synchronous": os.getenv("SQLITE_SYNCHRONOUS", "NORMAL"),
+        "busy_timeout": int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000")),
+        "mmap_size": int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024))),
+        "cache_size": int(os.getenv("SQLITE_CACHE_SIZE", "-65536")),
+    }
+
+
+def pool_settings_from_env() -> dict:
+    return {
+        "pool_size": int(os.getenv("DB_POOL_SIZE", "10")),
+        "max_overflow": int(os.getenv("DB_MAX_OVERFLOW", "20")),
+        "pool_timeout": float(os.getenv("DB_POOL_TIMEOUT", "30")),
+        "pool_recycle": int(os.getenv("DB_POOL_RECYCLE", "1800")),
+        "pool_pre_ping": True,
+    }
+
+
+def apply_sqlite_pragmas(engine: Engine, pragmas: dict):
+    @event.listens_for(engine, "connect")
+    def _set_pragmas(dbapi_conn, _record):
+        cursor = dbapi_conn.cursor()
+        try:
+            for name, value in pragmas.items():
+                cursor.execute(f"PRAGMA {name}={value}")
+        finally:
+            cursor.close()
+
+
+def make_engine(url: str, sqlite_pragmas: Optional[dict] = None, **kwargs) -> Engine:
+    """
+    Create an engine for url. SQLite gets the given pragmas (none = SQLite
+    defaults); other backends get the pool settings from the environment.
+    """
+    if url.startswith("sqlite"):
+        engine = create_engine(url, connect_args={"check_same_thread": False}, **kwargs)
+        if sqlite_pragmas:
+            apply_sqlite_pragmas(engine, sqlite_pragmas)
+        return engine
+
+    return create_engine(url, **{**pool_settings_from_env(), **kwargs})
+
+
+def async_url(url: str) -> str:
+    """
+    Map a sync DATABASE_URL (sqlite:///..., postgresql://...) to its async driver.
+    """
+    parsed = make_url(url)
+    backend = parsed.drivername.split("+")[0]
+    if backend not in ASYNC_DRIVERS:
+        raise ValueError(f"No async driver configured for {parsed.drivername}")
+    return parsed.set(drivername=ASYNC_DRIVERS[backend]).render_as_string(hide_password=False)
+
+
+def make_async_engine(url: str, sqlite_pragmas: Optional[dict] = None, **kwargs) -> AsyncEngine:
+    """
+    Async counterpart of make_engine() for the same database.
+    """
+    if url.startswith("sqlite"):
+        engine = create_async_engine(async_url(url), **kwargs)
+        if sqlite_pragmas:
+            apply_sqlite_pragmas(engine.sync_engine, sqlite_pragmas)
+        return engine
+
+    return create_async_engine(async_url(url), **{**pool_settings_from_env(), **kwargs})
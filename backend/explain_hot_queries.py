@@ -0,0 +1,117 @@
+"""
+Query-plan check for the hot queries.
+
+Runs the real code paths (next_unanswered_question, the report timeline
+loader and refresh, /chat/messages) against a small seeded SQLite database,
+captures the SQL they execute, and runs EXPLAIN QUERY PLAN on each statement. Fails if any of them
+has to scan a whole table instead of searching an index.
+
+Usage:
+    python explain_hot_queries.py
+"""
+import os
+import sys
+import tempfile
+from datetime import datetime, timedelta
+
+# Point the app at a throwaway database before it is imported
+_tmpdir = tempfile.mkdtemp(prefix="lulu_explain_")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_tmpdir, 'explain.db')}"
+
+from sqlalchemy import event
+
+from app import (
+    SessionLocal, engine, Question, Answer, ChatMessage, today, init_db,
+    next_unanswered_question, load_timeline_days, refresh_timelines, chat_messages_stmt,
+)
+
+TABLES = ("questions", "answers", "chat_messages", "daily_timelines")
+
+
+def seed(users: int = 5, days: int = 30, per_day: int = 6):
+    db = SessionLocal()
+    try:
+        for user_id in range(1, users + 1):
+            for day in range(days):
+                d = today() - timedelta(days=day)
+                ts = datetime.combine(d, datetime.min.time())
+                for i in range(per_day):
+                    q = Question(user_id=user_id, text=f"Q{i + 1}", q_date=d, order_index=i, source="daily")
+                    db.add(q)
+                    db.flush()
+                    db.add(Answer(user_id=user_id, question_id=q.id, text="fine", created_at=ts))
+                    db.add(ChatMessage(user_id=user_id, role="assistant", content=q.text,
+                                       question_id=q.id, m_date=d, created_at=ts))
+        refresh_timelines(db, list(range(1, users + 1)), today() - timedelta(days=days - 1), today())
+        db.commit()
+    finally:
+        db.close()
+
+
+def capture(fn):
+    """
+    Run fn(db) and return the SELECT statements it executed with their parameters.
+    """
+    captured = []
+
+    def on_execute(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith("SELECT"):
+            captured.append((statement, parameters))
+
+    event.listen(engine, "before_cursor_execute", on_execute)
+    db = SessionLocal()
+    try:
+        fn(db)
+    finally:
+        db.close()
+        event.remove(engine, "before_cursor_execute", on_execute)
+    return captured
+
+
+def full_scans(plan_rows):
+    scans = []
+    for row in plan_rows:
+        detail = row[-1]
+        words = detail.split()
+        # "SCAN <table>" (with or without an index) walks every row; "SEARCH" uses the index
+        if len(words) >= 2 and words[0] == "SCAN" and words[1] in TABLES:
+            scans.append(detail)
+    return scans
+
+
+HOT_QUERIES = [
+    ("next_unanswered_question", lambda db: next_unanswered_question(db, 1)),
+    ("load_timeline_days", lambda db: load_timeline_days(db, 1, today() - timedelta(days=14), today())),
+    ("refresh_timelines", lambda db: refresh_timelines(db, [1], today())),
+    ("/chat/messages", lambda db: db.scalars(chat_messages_stmt(1, today())).all()),
+    ("/chat/messages?after_id", lambda db: db.scalars(chat_messages_stmt(1, today(), after_id=10, limit=50)).all()),
+    ("/chat/messages?start_date&end_date", lambda db: db.scalars(
+        chat_messages_stmt(1, today() - timedelta(days=14), today())
+    ).all()),
+]
+
+
+def main():
+    init_db()
+    seed()
+    with engine.connect() as conn:
+        conn.exec_driver_sql("ANALYZE")
+
+    failed = False
+    for name, fn in HOT_QUERIES:
+        for statement, parameters in capture(fn):
+            with engine.connect() as conn:
+                plan = conn.exec_driver_sql("EXPLAIN QUERY PLAN " + statement, parameters).all()
+            scans = full_scans(plan)
+            print(f"{'❌' if scans else '✅'} {name}")
+            for row in plan:
+                print(f"     {row[-1]}")
+            failed = failed or bool(scans)
+
+    if failed:
+        print("\nSome hot queries scan a full table — check the composite indexes in app.py / migrations.py")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
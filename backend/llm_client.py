@@ -0,0 +1,107 @@
+"""
+Process-wide async OpenAI client.
+
+The client is built once (at API startup, or lazily on first use from CLI
+scripts) and shared by every generator so that HTTP connections and TLS
+sessions are kept alive and reused between requests.
+
+Tuning via environment variables:
+    OPENAI_API_KEY          API key (required)
+    OPENAI_BASE_URL         Optional alternative endpoint
+    LLM_MAX_CONNECTIONS     Max concurrent connections / in-flight calls (default 50)
+    LLM_MAX_KEEPALIVE       Idle keep-alive connections kept in the pool (default 20)
+    LLM_KEEPALIVE_EXPIRY    Seconds an idle connection is kept open (default 60)
+    LLM_TIMEOUT             Read timeout in seconds for a completion (default 120)
+    LLM_CONNECT_TIMEOUT     Connect timeout in seconds (default 10)
+    LLM_POOL_TIMEOUT        Seconds to wait for a free connection (default 60)
+    LLM_MAX_RETRIES         Retries on transient errors (default 2)
+"""
+import os
+from typing import TYPE_CHECKING, Optional
+
+if TYPE_CHECKING:
+    import httpx
+    from openai import AsyncOpenAI
+
+_client: Optional["AsyncOpenAI"] = None
+
+
+def _env_int(name: str, default: int) -> int:
+    return int(os.getenv(name, str(default)))
+
+
+def _env_float(name: str, default: float) -> float:
+    return float(os.getenv(name, str(default)))
+
+
+def build_client(http_client: Optional["httpx.AsyncClient"] = None) -> "AsyncOpenAI":
+    """
+    Build a new AsyncOpenAI client backed by a pooled httpx client.
+    """
+    # The SDK takes most of a second to import; only pay for it when a client is needed
+    import httpx
+    from openai import AsyncOpenAI
+
+    key = os.getenv("OPENAI_API_KEY")
+    if not key:
+        raise RuntimeError("OPENAI_API_KEY not set")
+
+    timeout = httpx.Timeout(
+        _env_float("LLM_TIMEOUT", 120.0),
+        connect=_env_float("LLM_CONNECT_TIMEOUT", 10.0),
+        pool=_env_float("LLM_POOL_TIMEOUT", 60.0),
+    )
+    if http_client is None:
+        http_client = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=_env_int("LLM_MAX_CONNECTIONS", 50),
+                max_keepalive_connections=_env_int("LLM_MAX_KEEPALIVE", 20),
+                keepalive_expiry=_env_float("LLM_KEEPALIVE_EXPIRY", 60.0),
+            ),
+            timeout=timeout,
+        )
+
+    return AsyncOpenAI(
+        api_key=key,
+        base_url=os.getenv("OPENAI_BASE_URL") or None,
+        http_client=http_client,
+        timeout=timeout,
+        max_retries=_env_int("LLM_MAX_RETRIES", 2),
+    )
+
+
+def init_client() -> Optional["AsyncOpenAI"]:
+    """
+    Build the shared client at startup. Without an API key this is a no-op
+    and the error is raised on first use instead, so the non-LLM endpoints
+    keep working.
+    """
+    global _client
+    if _client is None and os.getenv("OPENAI_API_KEY"):
+        _client = build_client()
+    return _client
+
+
+def get_client() -> "AsyncOpenAI":
+    """
+    Return the shared client, building it on first use.
+    """
+    global _client
+    if _client is None:
+        _client = build_client()
+    return _client
+
+
+def set_client(client: Optional["AsyncOpenAI"]) -> None:
+    """
+    Replace the shared client (e.g. with one pointing at a local stub).
+    """
+    global _client
+    _client = client
+
+
+async def close_client() -> None:
+    global _client
+    if _client is not None:
+        await _client.close()
+        _client = None
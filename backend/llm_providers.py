@@ -0,0 +1,273 @@
+"""
+LLM providers behind the generators in app.py.
+
+A provider takes chat-completion arguments (model, messages, response_format,
+...) and returns the completion text plus token usage, or streams the text.
+Two implementations:
+
+    openai  the shared AsyncOpenAI client from llm_client (default)
+    stub    local and deterministic, no network: schema-valid payloads for
+            DailyQuestionSet, FollowupOutput and TrendFollowupDict, plain text
+            for everything else (e.g. the physician report)
+
+Selection and stub tuning via environment variables:
+    LLM_PROVIDER            "openai" or "stub" (default openai)
+    LLM_STUB_LATENCY_MS     Delay before a stub completion (default 0)
+    LLM_STUB_JITTER_MS      Extra uniform random delay, 0..N ms (default 0)
+    LLM_STUB_TOKEN_DELAY_MS Delay between streamed stub tokens (default 0)
+    LLM_STUB_ERROR_RATE     Fraction of calls that raise StubLLMError (default 0)
+    LLM_STUB_SEED           Seed for jitter and error injection (default 0)
+"""
+import asyncio
+import hashlib
+import json
+import os
+import random
+from dataclasses import dataclass, field
+from typing import AsyncIterator, Optional
+
+import llm_client
+
+STUB_QUESTION_BANK = [
+    "How would you rate your energy level today on a scale of 1 to 10?",
+    "Did you sleep better, worse, or about the same as the previous night?",
+    "Have you experienced any pain or discomfort since yesterday?",
+    "Have you noticed any changes in your appetite or eating patterns?",
+    "How would you describe your mood today?",
+    "Have you taken your medication as prescribed?",
+    "Have you noticed any new symptoms since yesterday?",
+    "How much physical activity did you manage today?",
+    "Have you felt short of breath at any point today?",
+    "Have you had any headaches or dizziness today?",
+    "How well are you drinking fluids today?",
+    "How would you rate your stress level today on a scale of 1 to 10?",
+]
+
+STUB_FOLLOWUPS = [
+    "Has the change you mentioned become more frequent over the last few days?",
+    "Is there anything that makes it better or worse?",
+    "Has it affected your sleep or daily activities?",
+    "Have you mentioned this to your doctor or pharmacist yet?",
+]
+
+STUB_REPORT = """Patient summary
+Answers over the selected period are consistent, with no marked deterioration.
+
+Notable changes
+Energy and sleep answers vary slightly from day to day; no new symptoms were reported.
+
+Suggested follow-up
+Review medication adherence and sleep quality at the next visit."""
+
+
+def stub_question_set(rng: random.Random, count: int = 6) -> dict:
+    """
+    {"Q1": "...", ...} with `count` questions drawn from STUB_QUESTION_BANK; past
+    the size of the bank, repeats are numbered to keep them distinct.
+    Used by StubProvider and by app.bulk_seed() for offline data.
+    """
+    picked = rng.sample(STUB_QUESTION_BANK, min(count, len(STUB_QUESTION_BANK)))
+    while len(picked) < count:
+        picked.append(f"{rng.choice(STUB_QUESTION_BANK)} ({len(picked) + 1})")
+    return {f"Q{i + 1}": text for i, text in enumerate(picked)}
+
+
+@dataclass
+class Completion:
+    content: str
+    model: str = ""
+    usage: dict = field(default_factory=dict)   # prompt_tokens, completion_tokens, total_tokens
+
+
+class StubLLMError(RuntimeError):
+    """
+    Injected failure from StubProvider (LLM_STUB_ERROR_RATE).
+    """
+
+
+class LLMProvider:
+    name = "base"
+
+    def configured(self) -> bool:
+        """
+        False when a call is bound to fail for lack of configuration (e.g. no API key).
+        """
+        return True
+
+    async def complete(self, request: dict) -> Completion:
+        raise NotImplementedError
+
+    async def stream(self, request: dict) -> AsyncIterator[str]:
+        """
+        Yield the completion text as it arrives. Providers without streaming
+        yield the whole completion at once.
+        """
+        completion = await self.complete(request)
+        yield completion.content
+
+    async def close(self) -> None:
+        pass
+
+
+class OpenAIProvider(LLMProvider):
+    name = "openai"
+
+    def __init__(self, client=None):
+        self._client = client
+
+    def configured(self) -> bool:
+        return self._client is not None or bool(os.getenv("OPENAI_API_KEY"))
+
+    @property
+    def client(self):
+        return self._client or llm_client.get_client()
+
+    async def complete(self, request: dict) -> Completion:
+        resp = await self.client.chat.completions.create(**request)
+        usage = resp.usage.model_dump() if resp.usage is not None else {}
+        return Completion(content=resp.choices[0].message.content, model=resp.model, usage=usage)
+
+    async def stream(self, request: dict) -> AsyncIterator[str]:
+        stream = await self.client.chat.completions.create(**request, stream=True)
+        async for chunk in stream:
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+
+    async def close(self) -> None:
+        if self._client is not None:
+            await self._client.close()
+        else:
+            await llm_client.close_client()
+
+
+def _schema_name(request: dict) -> Optional[str]:
+    response_format = request.get("response_format") or {}
+    return (response_format.get("json_schema") or {}).get("name")
+
+
+def _prompt_text(request: dict) -> str:
+    return "\n".join(str(m.get("content", "")) for m in request.get("messages", []))
+
+
+def _estimate_tokens(text: str) -> int:
+    # Rough chars-per-token ratio for English; good enough for stub usage numbers
+    return max(1, len(text) // 4)
+
+
+class StubProvider(LLMProvider):
+    """
+    Offline provider. Payloads depend only on the prompt, so the same request
+    always gets the same answer; latency jitter and injected errors come from
+    a seeded RNG.
+    """
+    name = "stub"
+
+    def __init__(
+        self,
+        latency: float = 0.0,
+        jitter: float = 0.0,
+        token_delay: float = 0.0,
+        error_rate: float = 0.0,
+        seed: int = 0,
+    ):
+        self.latency = latency
+        self.jitter = jitter
+        self.token_delay = token_delay
+        self.error_rate = error_rate
+        self._rng = random.Random(seed)
+        self.calls = 0
+
+    @classmethod
+    def from_env(cls) -> "StubProvider":
+        return cls(
+            latency=float(os.getenv("LLM_STUB_LATENCY_MS", "0")) / 1000,
+            jitter=float(os.getenv("LLM_STUB_JITTER_MS", "0")) / 1000,
+            token_delay=float(os.getenv("LLM_STUB_TOKEN_DELAY_MS", "0")) / 1000,
+            error_rate=float(os.getenv("LLM_STUB_ERROR_RATE", "0")),
+            seed=int(os.getenv("LLM_STUB_SEED", "0")),
+        )
+
+    def payload(self, request: dict) -> str:
+        prompt = _prompt_text(request)
+        rng = random.Random(hashlib.sha256(prompt.encode("utf-8")).hexdigest())
+        schema = _schema_name(request)
+
+        if schema == "DailyQuestionSet":
+            return json.dumps(stub_question_set(rng))
+        if schema == "FollowupOutput":
+            picked = rng.sample(STUB_FOLLOWUPS, rng.randint(1, len(STUB_FOLLOWUPS)))
+            return json.dumps({"questions": [{"id": f"Q{i + 1}", "text": t} for i, t in enumerate(picked)]})
+        if schema == "TrendFollowupDict":
+            picked = rng.sample(STUB_FOLLOWUPS, rng.randint(0, 2))
+            return json.dumps({f"Q{i + 1}": text for i, text in enumerate(picked)})
+        return STUB_REPORT
+
+    async def _delay_or_fail(self):
+        self.calls += 1
+        delay = self.latency + (self._rng.uniform(0, self.jitter) if self.jitter else 0.0)
+        if delay:
+            await asyncio.sleep(delay)
+        if self.error_rate and self._rng.random() < self.error_rate:
+            raise StubLLMError("injected stub LLM failure")
+
+    async def complete(self, request: dict) -> Completion:
+        await self._delay_or_fail()
+        content = self.payload(request)
+        prompt_tokens = _estimate_tokens(_prompt_text(request))
+        completion_tokens = _estimate_tokens(content)
+        return Completion(
+            content=content,
+            model=f"stub:{request.get('model', '')}",
+            usage={
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens,
+            },
+        )
+
+    async def stream(self, request: dict) -> AsyncIterator[str]:
+        await self._delay_or_fail()
+        for i, word in enumerate(self.payload(request).split(" ")):
+            if self.token_delay:
+                await asyncio.sleep(self.token_delay)
+            yield word if i == 0 else " " + word
+
+
+PROVIDERS = {
+    "openai": OpenAIProvider,
+    "stub": StubProvider.from_env,
+}
+
+_provider: Optional[LLMProvider] = None
+
+
+def build_provider(name: Optional[str] = None) -> LLMProvider:
+    name = (name or os.getenv("LLM_PROVIDER", "openai")).lower()
+    if name not in PROVIDERS:
+        raise ValueError(f"Unknown LLM_PROVIDER {name!r} (expected one of {', '.join(PROVIDERS)})")
+    return PROVIDERS[name]()
+
+
+def get_provider() -> LLMProvider:
+    """
+    Return the process-wide provider, building it from LLM_PROVIDER on first use.
+    """
+    global _provider
+    if _provider is None:
+        _provider = build_provider()
+    return _provider
+
+
+def set_provider(provider: Optional[LLMProvider]) -> None:
+    """
+    Replace the process-wide provider (benchmarks, tests).
+    """
+    global _provider
+    _provider = provider
+
+
+async def close_provider() -> None:
+    global _provider
+    if _provider is not None:
+        await _provider.close()
+        _provider = None
@@ -0,0 +1,213 @@
+"""
+In-process metrics in the Prometheus text exposition format (served at /metrics).
+
+    http_request_duration_seconds{method,route,status}   histogram, via MetricsMiddleware
+    db_queries_per_request{route}                        histogram of SQL statements per request
+    llm_calls_total{generator,status}                    counter
+    llm_call_duration_seconds{generator}                 histogram
+    llm_tokens_total{generator,kind}                     counter (prompt / completion, from usage)
+    stage_duration_seconds{stage}                        histogram (report timeline, LLM, PDF build, ...)
+
+No client library: counters and histograms are plain dicts behind a lock,
+which is all a single process needs. With several workers each one exposes
+its own numbers; scrape them individually.
+"""
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Iterable, Optional, Tuple
+
+from sqlalchemy import event
+
+import profiling
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+LLM_BUCKETS = (0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 30.0, 60.0, 120.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 250, 1000)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Tuple[str, ...], values: Tuple, extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _num(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name: str, doc: str, labels: Iterable[str] = ()):
+        self.name, self.doc, self.label_names = name, doc, tuple(labels)
+        self._values: Dict[Tuple, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values, amount: float = 1.0):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0.0) + amount
+
+    def samples(self):
+        with self._lock:
+            items = sorted(self._values.items())
+        for values, total in items:
+            yield f"{self.name}{_labels(self.label_names, values)} {_num(total)}"
+
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, name: str, doc: str, labels: Iterable[str] = (), buckets=DEFAULT_BUCKETS):
+        self.name, self.doc, self.label_names = name, doc, tuple(labels)
+        self.buckets = tuple(sorted(buckets))
+        self._series: Dict[Tuple, list] = {}   # label values -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *label_values):
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [0] * len(self.buckets) + [0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    @contextmanager
+    def time(self, *label_values):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, *label_values)
+
+    def samples(self):
+        with self._lock:
+            items = sorted((k, list(v)) for k, v in self._series.items())
+        for values, series in items:
+            for bound, count in zip(self.buckets, series):
+                le = 'le="%s"' % _num(bound)
+                yield f"{self.name}_bucket{_labels(self.label_names, values, le)} {count}"
+            le = 'le="+Inf"'
+            yield f"{self.name}_bucket{_labels(self.label_names, values, le)} {series[-1]}"
+            yield f"{self.name}_sum{_labels(self.label_names, values)} {_num(series[-2])}"
+            yield f"{self.name}_count{_labels(self.label_names, values)} {series[-1]}"
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for m in self._metrics:
+            lines.append(f"# HELP {m.name} {m.doc}")
+            lines.append(f"# TYPE {m.name} {m.kind}")
+            lines.extend(m.samples())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+http_request_duration = registry.register(Histogram(
+    "http_request_duration_seconds", "HTTP request latency by route", ("method", "route", "status"),
+))
+db_queries_per_request = registry.register(Histogram(
+    "db_queries_per_request", "SQL statements executed per HTTP request", ("route",), buckets=QUERY_COUNT_BUCKETS,
+))
+llm_calls = registry.register(Counter(
+    "llm_calls_total", "LLM calls by generator and outcome", ("generator", "status"),
+))
+llm_call_duration = registry.register(Histogram(
+    "llm_call_duration_seconds", "LLM call latency by generator", ("generator",), buckets=LLM_BUCKETS,
+))
+llm_tokens = registry.register(Counter(
+    "llm_tokens_total", "LLM tokens by generator and kind (prompt/completion)", ("generator", "kind"),
+))
+stage_duration = registry.register(Histogram(
+    "stage_duration_seconds", "Time spent in named processing stages", ("stage",),
+))
+
+
+# --- DB query counting ---
+# Holds a one-element list per request; a list (not an int) so that thread-pool
+# work started from the request, which runs in a copy of the context, adds to it.
+_query_count: ContextVar[Optional[list]] = ContextVar("query_count", default=None)
+
+
+def _count_query(conn, cursor, statement, parameters, context, executemany):
+    counter = _query_count.get()
+    if counter is not None:
+        counter[0] += 1
+
+
+def instrument_engine(engine):
+    """
+    Count statements run on engine (a sync Engine, or AsyncEngine.sync_engine) against the current request.
+    """
+    event.listen(engine, "before_cursor_execute", _count_query)
+
+
+def record_llm_call(generator: str, elapsed: float, usage: Optional[dict] = None, ok: bool = True):
+    llm_calls.inc(generator, "ok" if ok else "error")
+    llm_call_duration.observe(elapsed, generator)
+    if usage:
+        llm_tokens.inc(generator, "prompt", amount=usage.get("prompt_tokens") or 0)
+        llm_tokens.inc(generator, "completion", amount=usage.get("completion_tokens") or 0)
+
+
+@contextmanager
+def timed(stage: str):
+    """
+    with timed("pdf_build"): ...  — records into stage_duration_seconds, and
+    as a span when the request is being profiled.
+    """
+    with profiling.span(stage), stage_duration.time(stage):
+        yield
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware recording latency and SQL statement count per HTTP request,
+    labelled with the route template (/reports/jobs/{job_id}) rather than the raw path.
+    Streaming responses are timed until the last body chunk is sent.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = {"code": 500}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            await send(message)
+
+        counter = [0]
+        token = _query_count.set(counter)
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - started
+            _query_count.reset(token)
+            route = getattr(scope.get("route"), "path", None) or "unmatched"
+            http_request_duration.observe(elapsed, scope["method"], route, status["code"])
+            db_queries_per_request.observe(counter[0], route)
@@ -0,0 +1,197 @@
+"""
+Minimal schema migrations for changes Base.metadata.create_all() cannot apply
+to an existing database (new indexes/constraints on existing tables, data
+fix-ups).
+
+Each migration runs once, in order. Applied versions are recorded in the
+schema_migrations table.
+
+Every worker runs this at startup, so the whole step (create_all included)
+runs in one transaction that first takes a database-wide lock: BEGIN
+IMMEDIATE on SQLite, a transaction-scoped advisory lock on Postgres. The
+applied versions are read after the lock is held, so workers that start
+together wait for the first one and then find nothing left to do.
+
+Environment variables:
+    MIGRATION_LOCK_TIMEOUT  Seconds to wait for the SQLite lock (default 300)
+"""
+import os
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+from sqlalchemy import Date, DateTime, Integer, MetaData, Text, column, select, table, text
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.exc import OperationalError
+
+import timelines
+
+
+def _dedupe_questions(conn: Connection):
+    """
+    Resolve duplicate (user_id, q_date, order_index) questions created by
+    concurrent generation, then enforce uniqueness.
+
+    Duplicates with the same text as an earlier question in the slot are merged
+    into it (answers and chat messages move over). Duplicates with different
+    text are separate questions the patient may have answered, so they keep
+    their rows and are renumbered after the day's last order_index.
+    """
+    dupes = conn.execute(text("""
+        SELECT user_id, q_date, order_index
+        FROM questions
+        GROUP BY user_id, q_date, order_index
+        HAVING COUNT(*) > 1
+    """)).all()
+    for user_id, q_date, order_index in dupes:
+        params = {"user_id": user_id, "q_date": q_date, "order_index": order_index}
+        rows = conn.execute(text("""
+            SELECT id, text FROM questions
+            WHERE user_id = :user_id AND q_date = :q_date AND order_index = :order_index
+            ORDER BY id
+        """), params).all()
+        next_index = conn.execute(text(
+            "SELECT MAX(order_index) FROM questions WHERE user_id = :user_id AND q_date = :q_date"
+        ), params).scalar() + 1
+
+        kept = {rows[0].text: rows[0].id}
+        for question_id, question_text in rows[1:]:
+            ids = {"dup_id": question_id, "keep_id": kept.get(question_text)}
+            if ids["keep_id"] is not None:
+                conn.execute(text("UPDATE answers SET question_id = :keep_id WHERE question_id = :dup_id"), ids)
+                conn.execute(text("UPDATE chat_messages SET question_id = :keep_id WHERE question_id = :dup_id"), ids)
+                conn.execute(text("DELETE FROM questions WHERE id = :dup_id"), ids)
+            else:
+                conn.execute(text("UPDATE questions SET order_index = :order_index WHERE id = :dup_id"),
+                             {"dup_id": question_id, "order_index": next_index})
+                kept[question_text] = question_id
+                next_index += 1
+
+    conn.execute(text(
+        "CREATE UNIQUE INDEX IF NOT EXISTS uq_questions_user_date_order "
+        "ON questions (user_id, q_date, order_index)"
+    ))
+
+
+def _hot_query_indexes(conn: Connection):
+    """
+    Composite indexes for next_unanswered_question, the report joins and /chat/messages.
+    """
+    conn.execute(text(
+        "CREATE INDEX IF NOT EXISTS ix_answers_question_user ON answers (question_id, user_id)"
+    ))
+    conn.execute(text(
+        "CREATE INDEX IF NOT EXISTS ix_chat_messages_user_date_created "
+        "ON chat_messages (user_id, m_date, created_at)"
+    ))
+
+
+_questions = table(
+    "questions",
+    column("id", Integer), column("user_id", Integer), column("q_date", Date),
+    column("order_index", Integer), column("text", Text),
+)
+_answers = table(
+    "answers",
+    column("question_id", Integer), column("user_id", Integer), column("text", Text), column("created_at", DateTime),
+)
+_daily_timelines = table(
+    "daily_timelines",
+    column("user_id", Integer), column("t_date", Date), column("payload", Text),
+    column("question_count", Integer), column("answer_count", Integer),
+    column("revision", Integer), column("updated_at", DateTime),
+)
+
+
+def _backfill_daily_timelines(conn: Connection, users_per_batch: int = 500):
+    """
+    Build daily_timelines (created by create_all) from the existing questions and answers.
+    """
+    conn.execute(_daily_timelines.delete())
+    user_ids = [u for (u,) in conn.execute(text("SELECT DISTINCT user_id FROM questions ORDER BY user_id"))]
+    now = datetime.utcnow()
+    for i in range(0, len(user_ids), users_per_batch):
+        batch = user_ids[i:i + users_per_batch]
+        q, a = _questions.c, _answers.c
+        rows = conn.execute(
+            select(q.user_id, q.q_date, q.id, q.text, a.created_at, a.text)
+            .select_from(_questions.outerjoin(_answers, (a.question_id == q.id) & (a.user_id == q.user_id)))
+            .where(q.user_id.in_(batch))
+            .order_by(q.user_id, q.q_date, q.order_index, a.created_at)
+        )
+        docs = timelines.group_rows(rows)
+        if docs:
+            conn.execute(_daily_timelines.insert(), [
+                {
+                    "user_id": user_id, "t_date": day, "payload": timelines.dumps(doc),
+                    "question_count": len(doc), "answer_count": sum(len(item["a"]) for item in doc),
+                    "revision": 1, "updated_at": now,
+                }
+                for (user_id, day), doc in docs.items()
+            ])
+
+
+# (version, description, fn) — append only, never renumber
+MIGRATIONS = [
+    (1, "unique questions per user/date/order", _dedupe_questions),
+    (2, "composite indexes for hot queries", _hot_query_indexes),
+    (3, "backfill materialized report timelines", _backfill_daily_timelines),
+]
+
+
+MIGRATION_LOCK_TIMEOUT = float(os.getenv("MIGRATION_LOCK_TIMEOUT", "300"))
+# Arbitrary application-wide key for pg_advisory_xact_lock
+ADVISORY_LOCK_KEY = 0x6C756C75
+
+
+@contextmanager
+def schema_lock(engine: Engine):
+    """
+    A connection inside a transaction that holds the schema lock until it commits
+    (or rolls back on error).
+    """
+    with engine.connect() as conn:
+        if conn.dialect.name == "sqlite":
+            # A backfill can outlast busy_timeout, so keep retrying up to MIGRATION_LOCK_TIMEOUT
+            deadline = time.monotonic() + MIGRATION_LOCK_TIMEOUT
+            while True:
+                try:
+                    conn.exec_driver_sql("BEGIN IMMEDIATE")
+                    break
+                except OperationalError as e:
+                    conn.rollback()
+                    if "locked" not in str(e) or time.monotonic() > deadline:
+                        raise
+                    time.sleep(0.2)
+        elif conn.dialect.name == "postgresql":
+            conn.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": ADVISORY_LOCK_KEY})
+        try:
+            yield conn
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+
+
+def run_migrations(engine: Engine, metadata: MetaData = None):
+    """
+    Under the schema lock: create missing tables from metadata (when given),
+    then apply the pending migrations.
+    """
+    with schema_lock(engine) as conn:
+        if metadata is not None:
+            metadata.create_all(bind=conn)
+        conn.execute(text(
+            "CREATE TABLE IF NOT EXISTS schema_migrations ("
+            "version INTEGER PRIMARY KEY, description VARCHAR(200) NOT NULL, applied_at TIMESTAMP NOT NULL)"
+        ))
+        applied = {v for (v,) in conn.execute(text("SELECT version FROM schema_migrations"))}
+
+        for version, description, fn in MIGRATIONS:
+            if version in applied:
+                continue
+            fn(conn)
+            conn.execute(
+                text("INSERT INTO schema_migrations (version, description, applied_at) VALUES (:v, :d, :t)"),
+                {"v": version, "d": description, "t": datetime.utcnow()},
+            )
@@ -0,0 +1,92 @@
+"""
+Nightly batch job: pre-generate the next day's questions for active users.
+
+A user counts as active if they sent or received a chat message, or answered
+a question, in the last N days. Users that already have questions for the
+target date are skipped, so the job is safe to re-run after a failure and
+only picks up what is still missing.
+
+Usage:
+    python pregenerate_questions.py [--days 7] [--date YYYY-MM-DD] [--concurrency 8]
+"""
+import argparse
+import asyncio
+import sys
+from datetime import datetime, timedelta
+
+from app import (
+    SessionLocal, Answer, ChatMessage, today, run_db,
+    generate_questions_once, has_questions_on, init_db,
+)
+import llm_providers
+
+DEFAULT_DESCRIPTION = "General daily health check"
+
+
+def find_active_users(days: int):
+    db = SessionLocal()
+    try:
+        since = today() - timedelta(days=days)
+        chatting = db.query(ChatMessage.user_id).filter(ChatMessage.m_date >= since)
+        answering = db.query(Answer.user_id).filter(
+            Answer.created_at >= datetime.combine(since, datetime.min.time())
+        )
+        return sorted(uid for (uid,) in chatting.union(answering).all())
+    finally:
+        db.close()
+
+
+async def pregenerate_for_user(user_id: int, target, description: str, retries: int) -> str:
+    if await run_db(has_questions_on, user_id, target):
+        return "skipped"
+
+    for attempt in range(1, retries + 2):
+        try:
+            stored = await generate_questions_once(user_id, target, description)
+            return "generated" if stored else "skipped"
+        except Exception as e:
+            if attempt > retries:
+                print(f"  ❌ user {user_id}: {e}")
+                return "failed"
+            await asyncio.sleep(2 ** attempt)
+
+
+async def run(days: int, target, concurrency: int, description: str, retries: int):
+    user_ids = find_active_users(days)
+    print(f"Found {len(user_ids)} active users in the last {days} days")
+
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def bounded(user_id: int):
+        async with semaphore:
+            return await pregenerate_for_user(user_id, target, description, retries)
+
+    try:
+        outcomes = await asyncio.gather(*(bounded(uid) for uid in user_ids))
+    finally:
+        await llm_providers.close_provider()
+    return {k: outcomes.count(k) for k in ("generated", "skipped", "failed")}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--days", type=int, default=7, help="activity window in days")
+    parser.add_argument("--date", help="target date (default: tomorrow, UTC)")
+    parser.add_argument("--concurrency", type=int, default=8, help="max users generated in parallel")
+    parser.add_argument("--retries", type=int, default=2, help="retries per user on LLM/DB errors")
+    parser.add_argument("--description", default=DEFAULT_DESCRIPTION)
+    args = parser.parse_args()
+
+    target = datetime.strptime(args.date, "%Y-%m-%d").date() if args.date else today() + timedelta(days=1)
+
+    print("=" * 60)
+    print(f"Pre-generating questions for {target}")
+    print("=" * 60)
+
+    init_db()
+    counts = asyncio.run(run(args.days, target, args.concurrency, args.description, args.retries))
+
+    print(f"\nGenerated: {counts['generated']}  Skipped: {counts['skipped']}  Failed: {counts['failed']}")
+    if counts["failed"]:
+        print("Re-run the job to retry the failed users.")
+        sys.exit(1)
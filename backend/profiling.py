@@ -0,0 +1,202 @@
+"""
+Opt-in per-request profiling: a span tree with durations.
+
+A request is profiled when it carries the `X-Profile: 1` header (unless
+PROFILE_ALLOW_HEADER=off) or is picked by PROFILE_SAMPLE_RATE. Spans cover SQL
+statements (engine events), LLM calls, ReportLab doc.build and the named
+stages timed through metrics.timed(). The result is returned as a
+Server-Timing header (summed per span name) plus X-Profile-Id, and written as
+JSON to PROFILE_DIR/<id>.json when that is set.
+
+When a request is not profiled, every hook is a single ContextVar lookup.
+
+Environment variables:
+    PROFILE_SAMPLE_RATE     Fraction of requests profiled without the header (default 0)
+    PROFILE_ALLOW_HEADER    "off" to ignore the X-Profile header (default on)
+    PROFILE_DIR             Directory for trace files (default: none, headers only)
+    PROFILE_SQL_MAX_CHARS   Statement text kept per SQL span (default 200)
+"""
+import json
+import os
+import random
+import time
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Optional
+
+from sqlalchemy import event
+
+PROFILE_HEADER = b"x-profile"
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+PROFILE_ALLOW_HEADER = os.getenv("PROFILE_ALLOW_HEADER", "on").lower() not in ("0", "off", "false", "no")
+PROFILE_DIR = os.getenv("PROFILE_DIR", "")
+SQL_MAX_CHARS = int(os.getenv("PROFILE_SQL_MAX_CHARS", "200"))
+
+
+class Span:
+    __slots__ = ("name", "attrs", "start", "end", "children")
+
+    def __init__(self, name: str, attrs: Optional[dict] = None, start: Optional[float] = None):
+        self.name = name
+        self.attrs = attrs or {}
+        self.start = time.perf_counter() if start is None else start
+        self.end: Optional[float] = None
+        self.children = []
+
+    def child(self, name: str, **attrs) -> "Span":
+        span = Span(name, attrs)
+        self.children.append(span)
+        return span
+
+    def finish(self):
+        self.end = time.perf_counter()
+
+    @property
+    def duration(self) -> float:
+        return ((self.end or time.perf_counter()) - self.start)
+
+    def to_dict(self, origin: Optional[float] = None) -> dict:
+        origin = self.start if origin is None else origin
+        d = {
+            "name": self.name,
+            "start_ms": round((self.start - origin) * 1000, 3),
+            "duration_ms": round(self.duration * 1000, 3),
+        }
+        if self.attrs:
+            d["attrs"] = self.attrs
+        if self.children:
+            d["children"] = [c.to_dict(origin) for c in self.children]
+        return d
+
+    def totals(self, acc: Optional[dict] = None) -> dict:
+        """
+        {name: [total seconds, count]} over all descendants.
+        """
+        acc = {} if acc is None else acc
+        for c in self.children:
+            total = acc.setdefault(c.name, [0.0, 0])
+            total[0] += c.duration
+            total[1] += 1
+            c.totals(acc)
+        return acc
+
+
+_current: ContextVar[Optional[Span]] = ContextVar("profile_span", default=None)
+
+
+def active() -> bool:
+    return _current.get() is not None
+
+
+@contextmanager
+def span(name: str, **attrs):
+    """
+    Time the block as a child of the current span; a no-op outside profiled requests.
+    """
+    parent = _current.get()
+    if parent is None:
+        yield None
+        return
+    s = parent.child(name, **attrs)
+    token = _current.set(s)
+    try:
+        yield s
+    finally:
+        s.finish()
+        _current.reset(token)
+
+
+def record(name: str, started: float, **attrs):
+    """
+    Add an already finished span (started..now) under the current span. For
+    work that cannot hold the context open, e.g. an async generator that
+    yields back to its consumer between chunks.
+    """
+    parent = _current.get()
+    if parent is None:
+        return
+    s = Span(name, attrs, start=started)
+    s.finish()
+    parent.children.append(s)
+
+
+# --- SQL spans ---
+def _before_execute(conn, cursor, statement, parameters, context, executemany):
+    parent = _current.get()
+    if parent is not None:
+        context._profile_span = parent.child("sql", statement=statement[:SQL_MAX_CHARS])
+
+
+def _after_execute(conn, cursor, statement, parameters, context, executemany):
+    s = getattr(context, "_profile_span", None)
+    if s is not None:
+        s.finish()
+
+
+def instrument_engine(engine):
+    """
+    Record a span per statement on engine (sync Engine or AsyncEngine.sync_engine).
+    """
+    event.listen(engine, "before_cursor_execute", _before_execute)
+    event.listen(engine, "after_cursor_execute", _after_execute)
+
+
+def server_timing(root: Span) -> str:
+    parts = [f"total;dur={root.duration * 1000:.1f}"]
+    for name, (seconds, count) in sorted(root.totals().items(), key=lambda kv: -kv[1][0]):
+        parts.append(f'{name};dur={seconds * 1000:.1f};desc="{count}x"')
+    return ", ".join(parts)
+
+
+def write_trace(profile_id: str, root: Span):
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    path = os.path.join(PROFILE_DIR, f"{profile_id}.json")
+    with open(path, "w") as f:
+        json.dump({"id": profile_id, **root.to_dict()}, f, indent=2)
+
+
+class ProfilingMiddleware:
+    """
+    ASGI middleware that opens the root span for profiled requests and
+    attaches the summary headers to the response.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    def _wanted(self, scope) -> bool:
+        if PROFILE_ALLOW_HEADER:
+            for key, value in scope.get("headers", ()):
+                if key == PROFILE_HEADER:
+                    return value not in (b"0", b"")
+        return PROFILE_SAMPLE_RATE > 0 and random.random() < PROFILE_SAMPLE_RATE
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self._wanted(scope):
+            await self.app(scope, receive, send)
+            return
+
+        profile_id = uuid.uuid4().hex[:16]
+        root = Span("request", {"method": scope["method"], "path": scope["path"]})
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                # Spans still running (streamed bodies) only appear in the trace file
+                headers = list(message.get("headers", []))
+                headers.append((b"x-profile-id", profile_id.encode()))
+                headers.append((b"server-timing", server_timing(root).encode()))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        token = _current.set(root)
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            root.finish()
+            _current.reset(token)
+            route = getattr(scope.get("route"), "path", None)
+            if route:
+                root.attrs["route"] = route
+            if PROFILE_DIR:
+                write_trace(profile_id, root)
@@ -0,0 +1,120 @@
+"""
+In-process job queue for PDF report builds.
+
+Jobs are pushed onto a bounded asyncio queue and executed by a fixed number of
+worker tasks, which caps how many reports (LLM call + ReportLab render) run at
+once. Finished jobs are kept for JOB_RETENTION so clients can poll and
+download, then dropped; at most max_finished of them are kept (oldest go
+first), since each holds its PDF. Callers that wait for the result themselves
+discard() the job once they have it.
+
+Builds that cannot go through the queue (the streamed preview) take a slot()
+instead, so they count against the same `workers` limit.
+"""
+import asyncio
+import contextvars
+import uuid
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from asyncio import QueueFull
+
+JOB_RETENTION = timedelta(hours=1)
+
+
+@dataclass
+class ReportJob:
+    params: Any
+    id: str = field(default_factory=lambda: uuid.uuid4().hex)
+    status: str = "queued"  # queued|running|done|failed
+    created_at: datetime = field(default_factory=datetime.utcnow)
+    finished_at: Optional[datetime] = None
+    result: Any = None
+    error: Optional[BaseException] = None
+    _finished: asyncio.Event = field(default_factory=asyncio.Event, repr=False)
+    # Context of the submitting request, so per-request instrumentation (query counts) follows the job
+    _context: contextvars.Context = field(default_factory=contextvars.copy_context, repr=False)
+
+    async def wait(self):
+        await self._finished.wait()
+
+
+class ReportJobQueue:
+    def __init__(self, handler: Callable[[ReportJob], Awaitable[Any]], workers: int = 2, max_queued: int = 20,
+                 max_finished: int = 50):
+        self.handler = handler
+        self.workers = workers
+        self.max_queued = max_queued
+        self.max_finished = max_finished
+        self.jobs: Dict[str, ReportJob] = {}
+        self._queue: Optional[asyncio.Queue] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._tasks: List[asyncio.Task] = []
+
+    def start(self):
+        self._queue = asyncio.Queue(maxsize=self.max_queued)
+        self._slots = asyncio.Semaphore(self.workers)
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def submit(self, params: Any) -> ReportJob:
+        """
+        Enqueue a job; raises QueueFull when max_queued jobs are already waiting.
+        """
+        if self._queue is None:
+            self.start()
+        self._prune()
+        job = ReportJob(params=params)
+        self._queue.put_nowait(job)
+        self.jobs[job.id] = job
+        return job
+
+    def slot(self) -> asyncio.Semaphore:
+        """
+        async with queue.slot(): ... — run a build outside the queue under the same concurrency cap.
+        """
+        if self._slots is None:
+            self.start()
+        return self._slots
+
+    def get(self, job_id: str) -> Optional[ReportJob]:
+        return self.jobs.get(job_id)
+
+    def discard(self, job_id: str):
+        """
+        Stop tracking a job (a running one still finishes, its result is just not kept).
+        """
+        self.jobs.pop(job_id, None)
+
+    def _prune(self):
+        cutoff = datetime.utcnow() - JOB_RETENTION
+        finished = sorted((j for j in self.jobs.values() if j.finished_at), key=lambda j: j.finished_at)
+        excess = len(finished) - self.max_finished
+        for i, job in enumerate(finished):
+            if i < excess or job.finished_at < cutoff:
+                del self.jobs[job.id]
+
+    async def _worker(self):
+        while True:
+            job = await self._queue.get()
+            try:
+                async with self._slots:
+                    job.status = "running"
+                    job.result = await job._context.run(asyncio.ensure_future, self.handler(job))
+                job.status = "done"
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                job.error = e
+                job.status = "failed"
+            finally:
+                job.finished_at = datetime.utcnow()
+                job._finished.set()
+                self._queue.task_done()
+                self._prune()
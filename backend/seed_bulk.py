@@ -0,0 +1,56 @@
+"""
+Fast synthetic data for load tests and report benchmarks.
+
+Seeds N users x D days of questions, answers and chat messages with bulk
+inserts and an offline question bank (no LLM calls). Same --seed gives the
+same data; user/days that already have questions are left alone.
+
+Usage:
+    python seed_bulk.py [--users 100] [--days 90] [--questions 6] [--answer-rate 1.0] [--seed 0]
+"""
+import argparse
+import time
+from datetime import datetime
+
+from app import SessionLocal, bulk_seed, init_db, today
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--first-user-id", type=int, default=1)
+    parser.add_argument("--days", type=int, default=90)
+    parser.add_argument("--questions", type=int, default=6, help="questions per day")
+    parser.add_argument("--answer-rate", type=float, default=1.0, help="fraction of questions answered")
+    parser.add_argument("--end-date", help="YYYY-MM-DD, defaults to today")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    end_d = datetime.strptime(args.end_date, "%Y-%m-%d").date() if args.end_date else today()
+    user_ids = list(range(args.first_user_id, args.first_user_id + args.users))
+
+    init_db()
+    db = SessionLocal()
+    try:
+        started = time.perf_counter()
+        counts = bulk_seed(
+            db, user_ids, end_d, args.days,
+            questions_per_day=args.questions,
+            answer_rate=args.answer_rate,
+            seed=args.seed,
+        )
+        elapsed = time.perf_counter() - started
+    finally:
+        db.close()
+
+    rows = counts["questions"] + counts["answers"] + counts["messages"]
+    print(f"Seeded {len(user_ids)} users x {args.days} days ending {end_d}")
+    print(f"  questions: {counts['questions']}")
+    print(f"  answers:   {counts['answers']}")
+    print(f"  messages:  {counts['messages']}")
+    print(f"  skipped user/days (already seeded): {counts['skipped_days']}")
+    print(f"  {rows} rows in {elapsed:.2f}s ({rows / elapsed if elapsed else 0:.0f} rows/s)")
+
+
+if __name__ == "__main__":
+    main()
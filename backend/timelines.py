@@ -0,0 +1,206 @@
+"""
+Per-user, per-day timeline documents behind the reports.
+
+A day's document lists that day's questions in order with their answers:
+
+    [{"id": 12, "q": "Question text", "a": [["2024-05-01 09:02:00", "Answer text"], ...]}, ...]
+
+app.py keeps one such document per (user, day) in the daily_timelines table.
+A new answer is appended to its question in place; other changes (questions
+added or deleted) rebuild the day. A report then reads one row per day in the
+range instead of joining the raw rows.
+
+The functions here only reshape data; they do no I/O.
+"""
+import json
+from datetime import date, timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+
+TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+
+def group_rows(rows: Iterable) -> Dict[Tuple[int, date], list]:
+    """
+    Build {(user_id, day): document} from (user_id, q_date, question_id,
+    question_text, answer_created_at, answer_text) rows ordered by user, day,
+    question order and answer time. Unanswered questions have None answer columns.
+    """
+    days: Dict[Tuple[int, date], list] = {}
+    last_question = {}
+    for user_id, q_date, question_id, question_text, answered_at, answer_text in rows:
+        key = (user_id, q_date)
+        doc = days.setdefault(key, [])
+        if last_question.get(key) != question_id:
+            doc.append({"id": question_id, "q": question_text, "a": []})
+            last_question[key] = question_id
+        if answered_at is not None:
+            doc[-1]["a"].append([answered_at.strftime(TIMESTAMP_FORMAT), answer_text])
+    return days
+
+
+def dumps(doc: list) -> str:
+    return json.dumps(doc, ensure_ascii=False, separators=(",", ":"))
+
+
+def append_answer(payload: str, question_id: int, answered_at, answer_text: str) -> Optional[str]:
+    """
+    The stored payload with one more answer for question_id, or None if the
+    question is not in it (the day has to be rebuilt instead).
+    """
+    doc = json.loads(payload)
+    for item in doc:
+        if item.get("id") == question_id:
+            item["a"].append([answered_at.strftime(TIMESTAMP_FORMAT), answer_text])
+            return dumps(doc)
+    return None
+
+
+def answer_timeline(days: Iterable[Tuple[date, list]]) -> Optional[dict]:
+    """
+    {question: {"A1": "timestamp, answer", ...}} for the JSON report, or None if there are no days.
+
+    Numbering restarts for every day a question is asked, as it always has, so
+    a question repeated on several days keeps the answers of its latest day.
+    """
+    result = None
+    for _day, doc in days:
+        result = {} if result is None else result
+        for item in doc:
+            answers = result.setdefault(item["q"], {})
+            for idx, (timestamp, text) in enumerate(item["a"], start=1):
+                answers[f"A{idx}"] = f"{timestamp}, {text}"
+    return result
+
+
+def daily_timeline(days: Iterable[Tuple[date, list]]) -> Optional[dict]:
+    """
+    {date: {question: first answer}} for the PDF report, or None if there are no days.
+    """
+    result = None
+    for day, doc in days:
+        result = {} if result is None else result
+        answered = result.setdefault(day.isoformat(), {})
+        for item in doc:
+            if item["a"]:
+                answered[item["q"]] = item["a"][0][1]  # One answer per question per day
+    return result
+
+
+# --- Compact prompt encoding ---
+# The report and trend prompts send days as minified JSON with each question's
+# text listed once and referenced by index, and each day as the number of days
+# since the previous entry (the first entry carries the full date):
+#
+#     {"q":["How did you sleep?","Any pain today?"],"d":[["2024-05-01",[[0,"Well"],[1,"No"]]],[1,[[0,"Badly"]]]]}
+#
+# The *_FORMAT strings below explain this to the model and go in the prompt with the data.
+COMPACT_DAILY_FORMAT = (
+    'Timeline format: "q" lists the questions once; "d" lists days as [day, [[question index, answer], ...]], '
+    "where day is a YYYY-MM-DD date for the first entry and afterwards the number of days since the previous entry."
+)
+COMPACT_ANSWERS_FORMAT = (
+    'Timeline format: "q" lists the questions once; "d" lists days as [day, [[question index, time, answer], ...]], '
+    "where day is a YYYY-MM-DD date for the first entry and afterwards the number of days since the previous entry, "
+    "and time is HH:MM (a full timestamp when answered on a later day). Answers are in the order given."
+)
+
+
+def _compact(days: Iterable[Tuple[date, list]], entries) -> dict:
+    questions: Dict[str, int] = {}
+    encoded = []
+    previous = None
+    for day, doc in days:
+        items = []
+        for item in doc:
+            index = questions.setdefault(item["q"], len(questions))
+            items.extend(entries(day, index, item["a"]))
+        encoded.append([day.isoformat() if previous is None else (day - previous).days, items])
+        previous = day
+    return {"q": list(questions), "d": encoded}
+
+
+def compact_daily(days: Iterable[Tuple[date, list]]) -> dict:
+    """
+    Compact form of daily_timeline(): the first answer per question per day.
+    """
+    return _compact(days, lambda day, index, answers: [[index, answers[0][1]]] if answers else [])
+
+
+def compact_answers(days: Iterable[Tuple[date, list]]) -> dict:
+    """
+    Compact form of every answer with its time, for trend analysis.
+    """
+    def entries(day, index, answers):
+        prefix = day.isoformat() + " "
+        return [
+            [index, timestamp[len(prefix):len(prefix) + 5] if timestamp.startswith(prefix) else timestamp[:16], text]
+            for timestamp, text in answers
+        ]
+    return _compact(days, entries)
+
+
+def plan_refresh(existing: dict, fresh: Dict[Tuple[int, date], list], keys: List[Tuple[int, date]]):
+    """
+    Diff stored rows against rebuilt documents for the given (user_id, day) keys.
+
+    existing maps key -> stored row object (with .payload, .question_count,
+    .answer_count, .revision). Returns (updates, inserts, deletes): rows
+    changed in place, keys to insert with their documents, and keys whose day
+    no longer has any questions.
+    """
+    updates, inserts, deletes = [], [], []
+    for key in keys:
+        doc = fresh.get(key)
+        row = existing.get(key)
+        if doc is None:
+            if row is not None:
+                deletes.append(key)
+            continue
+        payload = dumps(doc)
+        if row is None:
+            inserts.append((key, doc, payload))
+        elif row.payload != payload:
+            row.payload = payload
+            row.question_count = len(doc)
+            row.answer_count = sum(len(item["a"]) for item in doc)
+            row.revision += 1
+            updates.append(row)
+    return updates, inserts, deletes
+
+
+# --- Periods for hierarchical summaries ---
+PERIODS = ("week", "month")
+
+
+def period_start(day: date, period: str) -> date:
+    if period == "week":
+        return day - timedelta(days=day.weekday())  # Monday
+    return day.replace(day=1)
+
+
+def period_end(day: date, period: str) -> date:
+    if period == "week":
+        return period_start(day, period) + timedelta(days=6)
+    next_month = (day.replace(day=28) + timedelta(days=4)).replace(day=1)
+    return next_month - timedelta(days=1)
+
+
+def split_for_summary(start_d: date, end_d: date, recent_days: int, period: str):
+    """
+    Split [start_d, end_d] into older calendar periods to summarize and a raw tail.
+
+    Returns ([(period_start, period_end), ...], raw_start). The raw tail starts
+    at the beginning of the period holding the last `recent_days` days, so
+    summarized periods are whole weeks/months (and reusable by later reports)
+    except possibly the first one, which is clipped at start_d.
+    """
+    if recent_days <= 0:
+        return [], start_d
+    raw_start = max(start_d, period_start(end_d - timedelta(days=recent_days - 1), period))
+    periods = []
+    s = start_d
+    while s < raw_start:
+        e = min(period_end(s, period), raw_start - timedelta(days=1))
+        periods.append((s, e))
+        s = e + timedelta(days=1)
+    return periods, raw_start
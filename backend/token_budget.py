@@ -0,0 +1,85 @@
+"""
+Prompt size estimates and trimming to a token budget.
+
+Tokens are counted with tiktoken when it is installed and can load the
+model's encoding, and estimated at ~4 characters per token otherwise, which is
+close for English text and errs high for the compact JSON the prompts carry.
+
+app.py builds report and trend prompts through largest_fitting(): it tries
+fewer and fewer items (summaries, days, answers) until the estimated prompt
+fits PROMPT_TOKEN_BUDGET, so an oversized history is cut from the oldest end
+before it is sent instead of failing (or billing) at the provider.
+
+Environment variables:
+    PROMPT_TOKEN_BUDGET   Max estimated prompt tokens per LLM request (default 12000, 0 = no limit)
+"""
+import os
+from typing import Callable, Optional
+
+PROMPT_TOKEN_BUDGET = int(os.getenv("PROMPT_TOKEN_BUDGET", "12000"))
+CHARS_PER_TOKEN = 4
+MESSAGE_OVERHEAD = 4  # role and separators around each chat message
+FALLBACK_ENCODING = "o200k_base"
+
+_encodings = {}  # model -> tiktoken Encoding, or None when unavailable
+
+
+def _encoding(model: Optional[str]):
+    if model in _encodings:
+        return _encodings[model]
+    enc = None
+    try:
+        # Imported here: optional, and slow to import
+        import tiktoken
+        try:
+            enc = tiktoken.encoding_for_model(model or "")
+        except KeyError:
+            enc = tiktoken.get_encoding(FALLBACK_ENCODING)
+    except Exception:
+        # Not installed, or the encoding file could not be loaded (offline)
+        enc = None
+    _encodings[model] = enc
+    return enc
+
+
+def count_tokens(text: str, model: Optional[str] = None) -> int:
+    enc = _encoding(model)
+    if enc is not None:
+        return len(enc.encode(text, disallowed_special=()))
+    return -(-len(text) // CHARS_PER_TOKEN)
+
+
+def request_tokens(request: dict) -> int:
+    """
+    Estimated prompt tokens of chat completion arguments (model + messages).
+    """
+    model = request.get("model")
+    return sum(
+        MESSAGE_OVERHEAD + count_tokens(str(m.get("content", "")), model)
+        for m in request.get("messages", [])
+    )
+
+
+def fits(request: dict, budget: Optional[int] = None) -> bool:
+    budget = PROMPT_TOKEN_BUDGET if budget is None else budget
+    return budget <= 0 or request_tokens(request) <= budget
+
+
+def largest_fitting(build: Callable[[int], dict], n_max: int, n_min: int = 0,
+                    budget: Optional[int] = None) -> int:
+    """
+    The largest n in [n_min, n_max] for which the request build(n) fits the
+    budget, or n_min if none does. Assumes the prompt shrinks with n, so it
+    takes O(log n) builds.
+    """
+    if fits(build(n_max), budget):
+        return n_max
+    lo, hi = n_min, n_max - 1
+    best = n_min
+    while lo <= hi:
+        mid = (lo + hi) // 2
+        if fits(build(mid), budget):
+            best, lo = mid, mid + 1
+        else:
+            hi = mid - 1
+    return best